@@ -3,18 +3,26 @@ from openai import OpenAI
 import pandas as pd
 from datetime import datetime, timezone, timedelta
 import os
-import tempfile
 from pathlib import Path
-import PyPDF2
-import docx
-import pptx
-import csv
 import xlrd
 import openpyxl
 import io
 import base64
 from zoneinfo import ZoneInfo
 import re
+import time
+from storage import get_write_behind_queue
+from extraction import get_extraction_cache
+from documents import UploadRegistry, chunk_label, document_text, new_chunk, new_document
+from images import analyze_image_cached, get_image_cache
+from ingestion import JOB_FAILED, extraction_work, get_ingestion_queue
+from triage import triage_upload
+from retrieval import BM25Index, TfidfIndex, retrieval_query, select_context
+from budget import CHAT_MODEL, build_messages
+from repository import (
+    DATA_DIR, ACCOUNTS_TABLE, COMPLETION_TABLE, CONTENT_ACCESS_TABLE, FEEDBACK_TABLE, REGISTRATION_TABLE,
+    RESOLUTION_TIMES_TABLE, RESPONSE_TIMES_TABLE, TOPIC_TABLE, get_repository,
+)
 
 # Set page config
 st.set_page_config(
@@ -112,19 +120,9 @@ def is_within_tutoring_hours():
     st.session_state.debug_time["reason"] = "Outside tutoring hours"
     return False
 
-# Configure data directory
-DATA_DIR = Path("/data" if os.path.exists("/data") else ".")
-REGISTRATION_DATA_PATH = DATA_DIR / "registration_data.csv"
-ACCOUNTS_DATA_PATH = DATA_DIR / "accounts.csv"
-FEEDBACK_DATA_PATH = DATA_DIR / "feedback_data.csv"
-TOPIC_DATA_PATH = DATA_DIR / "topic_data.csv"
-COMPLETION_DATA_PATH = DATA_DIR / "completion_data.csv"
-RESPONSE_TIMES_PATH = DATA_DIR / "response_times.csv"
-CONTENT_ACCESS_PATH = DATA_DIR / "content_access.csv"
-RESOLUTION_TIMES_PATH = DATA_DIR / "resolution_times.csv"
-
-# Create data directory if it doesn't exist
-DATA_DIR.mkdir(exist_ok=True)
+# Every page reads and writes its tables through the shared repository
+# (CSV by default; NUANSWERS_STORAGE=sqlite or memory selects another backend)
+repo = get_repository()
 
 # Initialize all session state variables
 if "registered" not in st.session_state:
@@ -144,6 +142,14 @@ if "registration_data" not in st.session_state:
     ])
 if "uploaded_documents" not in st.session_state:
     st.session_state.uploaded_documents = []
+if "upload_registry" not in st.session_state:
+    st.session_state.upload_registry = UploadRegistry()
+if "ingestion_jobs" not in st.session_state:
+    st.session_state.ingestion_jobs = []
+if "retrieval_index" not in st.session_state:
+    st.session_state.retrieval_index = BM25Index()
+if "vector_index" not in st.session_state:
+    st.session_state.vector_index = TfidfIndex()
 if "search_query" not in st.session_state:
     st.session_state.search_query = ""
 if "doc_to_delete" not in st.session_state:
@@ -165,47 +171,21 @@ if "content_access" not in st.session_state:
 if "resolution_times" not in st.session_state:
     st.session_state.resolution_times = []
 
-def save_to_csv(data, filepath):
-    """Save data to CSV file with error handling"""
+def save_to_csv(data, table):
+    """Append data to a table with error handling"""
     try:
-        # Convert to DataFrame if it's a dictionary
-        if isinstance(data, dict):
-            df = pd.DataFrame([data])
-        elif isinstance(data, list):
-            df = pd.DataFrame(data)
-        else:
-            df = data
-            
-        # Load existing data if file exists
-        if filepath.exists():
-            existing_df = pd.read_csv(filepath)
-            df = pd.concat([existing_df, df], ignore_index=True)
-        
-        # Save to CSV
-        df.to_csv(filepath, index=False)
+        # Append only the new rows; existing rows are never re-read or rewritten
+        repo.append_rows(data, table)
     except Exception as e:
-        st.error(f"Failed to save data to {filepath}: {str(e)}")
+        st.error(f"Failed to save data to {table}: {str(e)}")
 
-def load_accounts():
-    """Load accounts from CSV for login lookup"""
-    if not ACCOUNTS_DATA_PATH.exists():
-        return pd.DataFrame(columns=["full_name", "student_id", "student_email", "grade", "campus", "major"])
-    try:
-        return pd.read_csv(ACCOUNTS_DATA_PATH)
-    except Exception:
-        return pd.DataFrame(columns=["full_name", "student_id", "student_email", "grade", "campus", "major"])
+def queue_telemetry(data, table):
+    """Hand a telemetry row to the background writer so the chat rerun never waits on disk I/O"""
+    get_write_behind_queue(repo.append_rows).enqueue(data, table)
 
 def find_account(student_id, student_email):
     """Find account by student_id and student_email (email match is case-insensitive). Returns row as dict or None."""
-    df = load_accounts()
-    if df.empty:
-        return None
-    email_lower = (student_email or "").strip().lower()
-    match = df[(df["student_id"].astype(str).str.strip() == str(student_id).strip()) &
-               (df["student_email"].astype(str).str.strip().str.lower() == email_lower)]
-    if match.empty:
-        return None
-    return match.iloc[0].to_dict()
+    return repo.find_account(student_id, student_email)
 
 def save_account(account_dict):
     """Append one account row (full_name, student_id, student_email, grade, campus, major) to accounts.csv"""
@@ -217,7 +197,7 @@ def save_account(account_dict):
         "campus": account_dict["campus"],
         "major": account_dict["major"],
     }
-    save_to_csv(row, ACCOUNTS_DATA_PATH)
+    save_to_csv(row, ACCOUNTS_TABLE)
 
 def save_registration(user_data, start_time):
     """Save registration data to CSV"""
@@ -249,7 +229,7 @@ def save_registration(user_data, start_time):
     }
     
     # Save to CSV
-    save_to_csv(new_registration, REGISTRATION_DATA_PATH)
+    save_to_csv(new_registration, REGISTRATION_TABLE)
 
 def track_content_access(content_id, content_type):
     """Track content access patterns"""
@@ -260,7 +240,7 @@ def track_content_access(content_id, content_type):
         "user_id": st.session_state.user_data.get("full_name")
     }
     st.session_state.content_access.append(entry)
-    save_to_csv(entry, CONTENT_ACCESS_PATH)
+    queue_telemetry(entry, CONTENT_ACCESS_TABLE)
 
 def track_resolution_time(start_time, end_time, topic):
     """Track problem resolution time"""
@@ -272,7 +252,7 @@ def track_resolution_time(start_time, end_time, topic):
         "user_id": st.session_state.user_data.get("full_name")
     }
     st.session_state.resolution_times.append(entry)
-    save_to_csv(entry, RESOLUTION_TIMES_PATH)
+    queue_telemetry(entry, RESOLUTION_TIMES_TABLE)
 
 # Create a sidebar
 with st.sidebar:
@@ -377,92 +357,29 @@ if not st.session_state.registered:
                         st.session_state.registered = True
                         st.rerun()
 
-# Function to extract text from different file types
-def extract_text_from_file(file):
-    file_extension = Path(file.name).suffix.lower()
-    
-    with tempfile.NamedTemporaryFile(delete=False, suffix=file_extension) as tmp_file:
-        tmp_file.write(file.getvalue())
-        tmp_file_path = tmp_file.name
-    
-    try:
-        if file_extension == '.pdf':
-            text = extract_text_from_pdf(tmp_file_path)
-        elif file_extension == '.docx':
-            text = extract_text_from_docx(tmp_file_path)
-        elif file_extension == '.txt':
-            with open(tmp_file_path, 'r', encoding='utf-8') as f:
-                text = f.read()
-        elif file_extension == '.pptx':
-            text = extract_text_from_pptx(tmp_file_path)
-        elif file_extension == '.csv':
-            text = extract_text_from_csv(tmp_file_path)
-        elif file_extension in ['.xls', '.xlsx']:
-            text = extract_text_from_excel(tmp_file_path)
-        else:
-            st.error(f"Unsupported file type: {file_extension}")
-            return None
-    except Exception as e:
-        st.error(f"Error processing file: {str(e)}")
-        return None
-    finally:
-        os.unlink(tmp_file_path)
-    
-    return text
-
-def extract_text_from_pdf(file_path):
-    text = ""
-    with open(file_path, 'rb') as file:
-        pdf_reader = PyPDF2.PdfReader(file)
-        for page in pdf_reader.pages:
-            text += page.extract_text()
-    return text
-
-def extract_text_from_docx(file_path):
-    doc = docx.Document(file_path)
-    return "\n".join([paragraph.text for paragraph in doc.paragraphs])
-
-def extract_text_from_pptx(file_path):
-    prs = pptx.Presentation(file_path)
-    text = ""
-    for slide in prs.slides:
-        for shape in slide.shapes:
-            if hasattr(shape, "text"):
-                text += shape.text + "\n"
-    return text
-
-def extract_text_from_csv(file_path):
-    text = ""
-    with open(file_path, 'r', encoding='utf-8') as f:
-        reader = csv.reader(f)
-        for row in reader:
-            text += ", ".join(row) + "\n"
-    return text
-
-def extract_text_from_excel(file_path):
-    text = ""
-    try:
-        # Read all sheets
-        excel_file = pd.ExcelFile(file_path)
-        for sheet_name in excel_file.sheet_names:
-            df = pd.read_excel(excel_file, sheet_name=sheet_name)
-            text += f"\nSheet: {sheet_name}\n"
-            text += df.to_string(index=False) + "\n"
-    except Exception as e:
-        st.error(f"Error reading Excel file: {str(e)}")
-        return None
-    return text
-
 # Function to search within documents
-def search_in_documents(query, documents):
-    if not query:
-        return documents
-    query = query.lower()
-    results = []
-    for doc in documents:
-        if query in doc['name'].lower() or query in doc['content'].lower():
-            results.append(doc)
-    return results
+def search_in_documents(query, documents, index):
+    """Documents matching query by name or content, best match first, and {file_id: match offsets}.
+
+    Content matches come from the session's inverted index (words are AND-ed,
+    OR separates alternatives, "quoted text" is a phrase), so nothing is rescanned.
+    """
+    if not query.strip():
+        return documents, {}
+    matches = {result["key"]: result["offsets"] for result in index.match_documents(query)}
+    name_query = query.strip().lower()
+    order = {key: rank for rank, key in enumerate(matches)}
+    results = [doc for doc in documents if doc['file_id'] in matches or name_query in doc['name'].lower()]
+    return sorted(results, key=lambda doc: order.get(doc['file_id'], len(order))), matches
+
+def highlight_matches(text, offsets, context=80, limit=10):
+    """Markdown excerpts around the first limit matches, with the matched text in bold"""
+    snippets = []
+    for start, end in offsets[:limit]:
+        before = text[max(0, start - context):start].replace("\n", " ")
+        after = text[end:end + context].replace("\n", " ")
+        snippets.append(f"…{before}**{text[start:end]}**{after}…")
+    return "\n\n".join(snippets)
 
 # Main application logic for registered users
 if st.session_state.registered:
@@ -509,6 +426,10 @@ if st.session_state.registered:
                         {"role": "assistant", "content": "Hello! I'm NuAnswers. I'm here to help you understand concepts and work through problems. What would you like to work on today?"}
                     ]
                     st.session_state.uploaded_documents = []
+                    st.session_state.upload_registry = UploadRegistry()
+                    st.session_state.ingestion_jobs = []
+                    st.session_state.retrieval_index = BM25Index()
+                    st.session_state.vector_index = TfidfIndex()
                     st.rerun()
         if st.sidebar.button("Logout", key="logout_from_course_form"):
             for key in list(st.session_state.keys()):
@@ -630,34 +551,38 @@ if st.session_state.registered:
     client = OpenAI(api_key=openai_api_key)
 
     # Move these two functions above the file upload section
-    def encode_image_to_base64(file):
-        """Convert uploaded image file to base64 string"""
-        return base64.b64encode(file.getvalue()).decode('utf-8')
+    def encode_image_to_base64(image_bytes):
+        """Convert image bytes to base64 string"""
+        return base64.b64encode(image_bytes).decode('utf-8')
+
+    def request_image_analysis(image_bytes, mime):
+        """Ask OpenAI's GPT-4 Vision model to describe an (already downscaled) image"""
+        base64_image = encode_image_to_base64(image_bytes)
+        response = client.chat.completions.create(
+            model="gpt-4-vision-preview",
+            messages=[
+                {
+                    "role": "user",
+                    "content": [
+                        {"type": "text", "text": "Please analyze this image in the context of accounting, finance, or business studies. Describe any relevant equations, problems, charts, or concepts shown."},
+                        {
+                            "type": "image_url",
+                            "image_url": f"data:{mime};base64,{base64_image}"
+                        }
+                    ]
+                }
+            ],
+            max_tokens=300
+        )
+        return response.choices[0].message.content
 
-    def analyze_image(file):
-        """Analyze image content using OpenAI's GPT-4 Vision model"""
+    def analyze_image(data):
+        """Analyze image content, reusing the cached analysis of identical images (runs as a background job)"""
         try:
-            base64_image = encode_image_to_base64(file)
-            response = client.chat.completions.create(
-                model="gpt-4-vision-preview",
-                messages=[
-                    {
-                        "role": "user",
-                        "content": [
-                            {"type": "text", "text": "Please analyze this image in the context of accounting, finance, or business studies. Describe any relevant equations, problems, charts, or concepts shown."},
-                            {
-                                "type": "image_url",
-                                "image_url": f"data:image/jpeg;base64,{base64_image}"
-                            }
-                        ]
-                    }
-                ],
-                max_tokens=300
-            )
-            return response.choices[0].message.content
+            return analyze_image_cached(data, request_image_analysis, get_image_cache(DATA_DIR / "image_cache"))
         except Exception as e:
-            st.error(f"Error analyzing image: {str(e)}")
-            return None
+            # The image is still added, just without an analysis
+            return None, {"error": str(e)}
 
     # File upload section
     st.subheader("📄 Upload Course Materials")
@@ -668,33 +593,98 @@ if st.session_state.registered:
     )
     
     if uploaded_files:
+        # O(1) per file on reruns: only uploads with an unseen file_id are read and fingerprinted
+        registry = st.session_state.upload_registry
+        new_files = []
         for file in uploaded_files:
-            if file not in [doc['file'] for doc in st.session_state.uploaded_documents]:
-                file_extension = Path(file.name).suffix.lower()
-                
-                # Handle image files differently
-                if file_extension in ['.png', '.jpg', '.jpeg']:
-                    # Analyze image content
-                    image_analysis = analyze_image(file)
-                    
-                    st.session_state.uploaded_documents.append({
-                        'file': file,
-                        'name': file.name,
-                        'content': f"[Image Analysis: {image_analysis}]" if image_analysis else f"[Image File: {file.name}]",
-                        'is_image': True,
-                        'image_analysis': image_analysis
-                    })
-                    st.success(f"Successfully uploaded and analyzed image {file.name}")
+            if registry.is_known(file.file_id):
+                continue
+            file_fingerprint, duplicate_of = registry.register(file.file_id, file.getvalue(), file.name)
+            if duplicate_of is not None:
+                st.info(f"{file.name} is identical to {duplicate_of}, which is already uploaded")
+                continue
+            # Byte-level checks only (no parser runs in the script thread); parser checks run in the worker
+            triage = triage_upload(file.name, file.getvalue())
+            if triage["rejected"]:
+                registry.forget(file_fingerprint)
+                st.error(f"{file.name} was not processed: {triage['rejected']}")
+                continue
+            if triage["notes"]:
+                st.info(f"{file.name}: {'; '.join(triage['notes'])}")
+            new_files.append((file, file_fingerprint))
+
+        # Extraction and image analysis run as background jobs so the page (and chat) stays responsive
+        ingestion_queue = get_ingestion_queue()
+        for file, file_fingerprint in new_files:
+            data = file.getvalue()
+            if Path(file.name).suffix.lower() in ['.png', '.jpg', '.jpeg']:
+                job = ingestion_queue.submit(file.name, "image", lambda progress, data=data: analyze_image(data))
+            else:
+                # Parsed in a worker process with per-file time and memory limits
+                job = ingestion_queue.submit(
+                    file.name, "document",
+                    extraction_work(file.name, data, get_extraction_cache(DATA_DIR / "extraction_cache")))
+            st.session_state.ingestion_jobs.append({
+                "job": job,
+                "file_id": file.file_id,
+                "fingerprint": file_fingerprint,
+                "image_bytes": data if job.kind == "image" else None,
+            })
+
+    def collect_ingestion_jobs():
+        """Move finished background jobs into uploaded_documents; returns how many finished"""
+        finished = [entry for entry in st.session_state.ingestion_jobs if entry["job"].is_finished]
+        for entry in finished:
+            st.session_state.ingestion_jobs.remove(entry)
+            job = entry["job"]
+            if job.status == JOB_FAILED:
+                st.session_state.upload_registry.forget(entry["fingerprint"])
+                st.toast(f"Error processing {job.name}: {job.error}", icon="⚠️")
+            elif job.kind == "image":
+                image_analysis, image_info = job.result
+                content = f"[Image Analysis: {image_analysis}]" if image_analysis else f"[Image File: {job.name}]"
+                document = new_document(
+                    job.name, [new_chunk(content, "image")], file_id=entry["file_id"], is_image=True,
+                    fingerprint=entry["fingerprint"], image_bytes=entry["image_bytes"], image_analysis=image_analysis
+                )
+                st.session_state.uploaded_documents.append(document)
+                st.session_state.retrieval_index.add_document(document["file_id"], document["name"], document["chunks"])
+                st.session_state.vector_index.add_document(document["file_id"], document["name"], document["chunks"])
+                if image_info.get("error"):
+                    st.toast(f"Error analyzing image {job.name}: {image_info['error']}", icon="⚠️")
+                elif image_info.get("cached"):
+                    st.toast(f"Added image {job.name} (reused a previous analysis)")
                 else:
-                    text = extract_text_from_file(file)
-                    if text:
-                        st.session_state.uploaded_documents.append({
-                            'file': file,
-                            'name': file.name,
-                            'content': text,
-                            'is_image': False
-                        })
-                        st.success(f"Successfully processed {file.name}")
+                    saved_kb = (image_info["original_bytes"] - image_info["prepared_bytes"]) / 1024
+                    st.toast(f"Analyzed image {job.name} in {image_info['seconds']:.1f}s "
+                             f"(sent {image_info['prepared_bytes'] / 1024:,.0f} KB, saved {saved_kb:,.0f} KB)")
+            elif job.result:
+                document = new_document(job.name, job.result, file_id=entry["file_id"], fingerprint=entry["fingerprint"])
+                st.session_state.uploaded_documents.append(document)
+                # Indexed once here; each chat message then only scores the index
+                st.session_state.retrieval_index.add_document(document["file_id"], document["name"], document["chunks"])
+                st.session_state.vector_index.add_document(document["file_id"], document["name"], document["chunks"])
+                st.toast(f"Successfully processed {job.name}")
+            else:
+                st.session_state.upload_registry.forget(entry["fingerprint"])
+        return len(finished)
+
+    @st.fragment(run_every=1.0)
+    def show_ingestion_jobs():
+        """Poll background jobs; re-run the whole page once any of them has finished"""
+        if collect_ingestion_jobs():
+            st.rerun()
+        for entry in st.session_state.ingestion_jobs:
+            job = entry["job"]
+            if job.progress:
+                done, total = job.progress
+                st.progress(done / max(total, 1), text=f"{job.name}: page {done} of {total}")
+            else:
+                st.caption(f"⏳ {job.name}: {job.status}")
+
+    collect_ingestion_jobs()
+    if st.session_state.ingestion_jobs:
+        show_ingestion_jobs()
     
     # Search and document management section
     if st.session_state.uploaded_documents:
@@ -732,7 +722,12 @@ if st.session_state.registered:
                         st.rerun()
         
         # Display filtered documents
-        filtered_docs = search_in_documents(st.session_state.search_query, st.session_state.uploaded_documents)
+        search_start = time.perf_counter()
+        filtered_docs, match_offsets = search_in_documents(st.session_state.search_query,
+                                                           st.session_state.uploaded_documents,
+                                                           st.session_state.retrieval_index)
+        if st.session_state.search_query:
+            st.caption(f"{len(filtered_docs)} matching documents in {(time.perf_counter() - search_start) * 1000:.2f} ms")
         
         if not filtered_docs:
             st.info("No documents match your search query.")
@@ -741,39 +736,34 @@ if st.session_state.registered:
                 cols = st.columns([4, 1])
                 with cols[0].expander(doc['name']):
                     if doc.get('is_image', False):
-                        st.image(doc['file'], caption=doc['name'])
+                        st.image(doc['image_bytes'], caption=doc['name'])
                         if doc.get('image_analysis'):
                             st.markdown("**Image Analysis:**")
                             st.markdown(doc['image_analysis'])
                     else:
-                        # Highlight search terms in content
-                        content = doc['content']
-                        if st.session_state.search_query:
-                            query = st.session_state.search_query.lower()
-                            start = content.lower().find(query)
-                            if start != -1:
-                                end = start + len(query)
-                                highlighted = (
-                                    content[:start] +
-                                    f"**{content[start:end]}**" +
-                                    content[end:]
-                                )
-                                st.markdown(highlighted)
-                            else:
-                                st.text(content[:500] + "..." if len(content) > 500 else content)
+                        st.caption(f"{len(doc['chunks'])} chunks · {doc['chars']:,} characters · ~{doc['tokens']:,} tokens")
+                        # Highlight search matches from the offsets the index returned
+                        content = document_text(doc)
+                        offsets = match_offsets.get(doc['file_id'])
+                        if offsets:
+                            st.caption(f"{len(offsets):,} matches")
+                            st.markdown(highlight_matches(content, offsets))
                         else:
                             st.text(content[:500] + "..." if len(content) > 500 else content)
                 
                 # Delete button with confirmation
                 if cols[1].button("🗑️", key=f"delete_{i}"):
-                    st.session_state.doc_to_delete = doc
+                    st.session_state.doc_to_delete = doc['file_id']
                 
                 # Confirmation dialog
-                if st.session_state.doc_to_delete == doc:
+                if st.session_state.doc_to_delete == doc['file_id']:
                     st.warning(f"Are you sure you want to delete {doc['name']}?")
                     confirm_cols = st.columns(2)
                     if confirm_cols[0].button("Yes, delete it", key=f"confirm_delete_{i}"):
                         st.session_state.uploaded_documents.remove(doc)
+                        st.session_state.upload_registry.forget(doc.get('fingerprint'))
+                        st.session_state.retrieval_index.remove_document(doc['file_id'])
+                        st.session_state.vector_index.remove_document(doc['file_id'])
                         st.session_state.doc_to_delete = None
                         st.rerun()
                     if confirm_cols[1].button("Cancel", key=f"cancel_delete_{i}"):
@@ -804,20 +794,17 @@ if st.session_state.registered:
                 "user_id": st.session_state.user_data.get("full_name")
             }
             st.session_state.response_times.append(entry)
-            save_to_csv(entry, RESPONSE_TIMES_PATH)
+            queue_telemetry(entry, RESPONSE_TIMES_TABLE)
 
-        # Prepare context from uploaded documents
-        context = ""
+        # Document excerpts most relevant to the latest turns, best first
+        excerpts = []
         if st.session_state.uploaded_documents:
-            context = "\n\n".join([f"Document: {doc['name']}\nContent: {doc['content']}" 
-                                 for doc in st.session_state.uploaded_documents])
-            context = f"Here is the context from uploaded documents:\n\n{context}\n\n"
+            hits = select_context([st.session_state.retrieval_index, st.session_state.vector_index],
+                                  retrieval_query(st.session_state.messages))
+            excerpts = [f"Document: {hit['name']} ({chunk_label(hit['chunk'])})\nContent: {hit['chunk']['text']}"
+                        for hit in hits]
 
-        # Generate a response using the OpenAI API
-        stream = client.chat.completions.create(
-            model="gpt-4.1",
-            messages=[
-                {"role": "system", "content": f"""You are an Accounting & Finance Tutor. Your role is to guide students through their homework and exam preparation through a conversational, step-by-step approach.
+        system_prompt = """You are an Accounting & Finance Tutor. Your role is to guide students through their homework and exam preparation through a conversational, step-by-step approach.
 
 IMPORTANT RULES:
 1. NEVER give direct answers or solutions
@@ -841,10 +828,18 @@ Tutor: "Good! Now, what do you think we should do with this information?"
 
 Example of bad tutoring:
 "Here's how to solve it: First, do this, then do that, then calculate this..."
-[giving multiple steps at once]"""},
-                {"role": "system", "content": context},
-                *[{"role": m["role"], "content": m["content"]} for m in st.session_state.messages]
-            ],
+[giving multiple steps at once]"""
+
+        # Fit the system prompt, recent turns, excerpts and older turns into the prompt token budget
+        request_messages, _ = build_messages(
+            system_prompt, st.session_state.messages, excerpts,
+            context_header="Here are the most relevant excerpts from the uploaded documents:\n\n",
+        )
+
+        # Generate a response using the OpenAI API
+        stream = client.chat.completions.create(
+            model=CHAT_MODEL,
+            messages=request_messages,
             stream=True,
         )
 
@@ -880,6 +875,10 @@ Example of bad tutoring:
             {"role": "assistant", "content": "Hello! I'm NuAnswers. I'm here to help you understand concepts and work through problems. What would you like to work on today?"}
         ]
         st.session_state.uploaded_documents = []
+        st.session_state.upload_registry = UploadRegistry()
+        st.session_state.ingestion_jobs = []
+        st.session_state.retrieval_index = BM25Index()
+        st.session_state.vector_index = TfidfIndex()
         st.rerun()
     if st.sidebar.button("Logout"):
         st.session_state.logout_initiated = True
@@ -890,13 +889,9 @@ def show_admin_panel():
     st.header("Admin Panel")
     
     try:
-        # Load data from CSV
-        csv_path = "registration_data.csv"
-        if os.path.exists(csv_path):
-            df = pd.read_csv(csv_path)
-            
-            # Convert timestamp to datetime
-            df['timestamp'] = pd.to_datetime(df['timestamp'])
+        # Typed, cached load from the shared repository
+        df = repo.registrations()
+        if not df.empty:
             
             # Calculate statistics
             total_registrations = len(df)
@@ -935,7 +930,7 @@ def save_feedback(rating, topic, difficulty):
         "difficulty": difficulty
     }
     st.session_state.feedback_data.append(feedback_entry)
-    save_to_csv(feedback_entry, FEEDBACK_DATA_PATH)
+    queue_telemetry(feedback_entry, FEEDBACK_TABLE)
 
 def track_topic(topic, difficulty=None):
     """Track topic data"""
@@ -947,7 +942,7 @@ def track_topic(topic, difficulty=None):
         "difficulty": difficulty
     }
     st.session_state.topic_data.append(topic_entry)
-    save_to_csv(topic_entry, TOPIC_DATA_PATH)
+    queue_telemetry(topic_entry, TOPIC_TABLE)
 
 def track_completion(completed):
     """Track course completion"""
@@ -958,7 +953,7 @@ def track_completion(completed):
         "completed": completed
     }
     st.session_state.completion_data.append(completion_entry)
-    save_to_csv(completion_entry, COMPLETION_DATA_PATH)
+    queue_telemetry(completion_entry, COMPLETION_TABLE)
 
 def track_system_status(status, start_time, end_time=None):
     """Track system uptime and status"""
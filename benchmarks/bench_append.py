@@ -0,0 +1,96 @@
+"""Benchmark CSV append latency against the size of the existing file.
+
+Usage:
+    python benchmarks/bench_append.py [--sizes 1000 100000 1000000] [--appends 50] [--legacy]
+"""
+import argparse
+import csv
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from storage import append_rows  # noqa: E402
+
+REGISTRATION_COLUMNS = [
+    "timestamp", "full_name", "student_id", "student_email", "grade", "campus",
+    "major", "course_name", "course_id", "professor", "professor_email", "usage_time_minutes"
+]
+
+
+def make_row(i):
+    """Build one registration-shaped row"""
+    return {
+        "timestamp": f"2025-{(i % 12) + 1:02d}-{(i % 28) + 1:02d} 10:{i % 60:02d}:00",
+        "full_name": f"Student {i}",
+        "student_id": f"{1000000 + i % 9000000}",
+        "student_email": f"student{i}@student.fdu.edu",
+        "grade": "Junior",
+        "campus": "Florham",
+        "major": "Accounting",
+        "course_name": "Intermediate Accounting",
+        "course_id": "ACCT_2021_01",
+        "professor": "Prof. Smith",
+        "professor_email": "smith@fdu.edu",
+        "usage_time_minutes": 12.5,
+    }
+
+
+def seed_file(path, size):
+    """Write a CSV with size existing rows"""
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=REGISTRATION_COLUMNS)
+        writer.writeheader()
+        for i in range(size):
+            writer.writerow(make_row(i))
+
+
+def legacy_save_to_csv(data, filepath):
+    """The previous read-concat-rewrite implementation of save_to_csv"""
+    df = pd.DataFrame([data])
+    if filepath.exists():
+        existing_df = pd.read_csv(filepath)
+        df = pd.concat([existing_df, df], ignore_index=True)
+    df.to_csv(filepath, index=False)
+
+
+def time_appends(writer, path, appends):
+    """Return the median append latency in milliseconds"""
+    timings = []
+    for i in range(appends):
+        row = make_row(i)
+        start = time.perf_counter()
+        writer(row, path)
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return timings[len(timings) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 100000, 1000000])
+    parser.add_argument("--appends", type=int, default=50)
+    parser.add_argument("--legacy", action="store_true",
+                        help="also time the old read-concat-rewrite path (slow on large files)")
+    args = parser.parse_args()
+
+    print(f"{'existing rows':>14} | {'append (ms)':>12} | {'legacy (ms)':>12}")
+    print("-" * 45)
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in args.sizes:
+            path = Path(tmp) / f"registration_{size}.csv"
+            seed_file(path, size)
+            append_ms = time_appends(append_rows, path, args.appends)
+            legacy = "-"
+            if args.legacy:
+                seed_file(path, size)
+                legacy = f"{time_appends(legacy_save_to_csv, path, max(1, args.appends // 10)):.3f}"
+            print(f"{size:>14,} | {append_ms:>12.3f} | {legacy:>12}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Benchmark upload text extraction: temporary-file round-trip vs in-memory.
+
+"tempfile" reproduces the old extract_text_from_file path (write the upload
+to a NamedTemporaryFile, parse it by path, unlink it); "memory" is
+extraction.extract_text_from_bytes. Each (format, mode) pair runs in its own
+process so peak RSS is measured in isolation.
+
+Usage:
+    python benchmarks/bench_extraction.py [--pages 50] [--repeat 5]
+"""
+import argparse
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from extraction import EXTRACTORS, extract_text_from_bytes  # noqa: E402
+
+from corpus import Corpus  # noqa: E402
+
+
+def extract_via_tempfile(data, extension):
+    """The old path: copy the upload to disk and parse it by path"""
+    with tempfile.NamedTemporaryFile(delete=False, suffix=extension) as tmp_file:
+        tmp_file.write(data)
+        tmp_file_path = tmp_file.name
+    try:
+        return EXTRACTORS[extension](tmp_file_path)
+    finally:
+        os.unlink(tmp_file_path)
+
+
+def worker(mode, sample_path, repeat):
+    """Time repeat extractions of one sample in this process and print JSON"""
+    data = Path(sample_path).read_bytes()
+    extension = Path(sample_path).suffix
+    extract = extract_via_tempfile if mode == "tempfile" else extract_text_from_bytes
+    baseline_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        text = extract(data, extension)
+        timings.append((time.perf_counter() - start) * 1000)
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({"ms": statistics.median(timings), "rss_kb": peak_kb - baseline_kb, "chars": len(text)}))
+
+
+def run_worker(mode, sample_path, repeat):
+    output = subprocess.run(
+        [sys.executable, __file__, "--worker", mode, str(sample_path), "--repeat", str(repeat)],
+        check=True, capture_output=True, text=True,
+    ).stdout
+    return json.loads(output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=50, help="pages/slides (x40 lines or rows for the other formats)")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--worker", nargs=2, metavar=("MODE", "SAMPLE"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.worker:
+        worker(args.worker[0], args.worker[1], args.repeat)
+        return
+
+    print(f"{'format':>6} | {'size KB':>8} | {'tempfile ms':>11} | {'memory ms':>9} | "
+          f"{'tempfile +RSS KB':>16} | {'memory +RSS KB':>14}")
+    print("-" * 82)
+    with tempfile.TemporaryDirectory() as tmp:
+        for extension, make in Corpus().formats().items():
+            sample = Path(tmp) / f"sample{extension}"
+            sample.write_bytes(make(args.pages))
+            legacy = run_worker("tempfile", sample, args.repeat)
+            memory = run_worker("memory", sample, args.repeat)
+            print(f"{extension:>6} | {sample.stat().st_size / 1024:>8,.0f} | {legacy['ms']:>11.1f} | "
+                  f"{memory['ms']:>9.1f} | {legacy['rss_kb']:>16,} | {memory['rss_kb']:>14,}")
+
+
+if __name__ == "__main__":
+    main()
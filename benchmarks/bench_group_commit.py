@@ -0,0 +1,69 @@
+"""Benchmark durable CSV commits/sec with concurrent writers.
+
+Compares the group-commit writer used by storage.append_rows against one
+write + fsync per call.
+
+Usage:
+    python benchmarks/bench_group_commit.py [--writers 1 10 50] [--appends 200]
+"""
+import argparse
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from storage import GroupCommitWriter, _append_records  # noqa: E402
+
+from bench_append import make_row  # noqa: E402
+
+
+def run_writers(append, path, writers, appends):
+    """Run writers threads each appending appends rows; return elapsed seconds"""
+    barrier = threading.Barrier(writers + 1)
+
+    def work(worker):
+        barrier.wait()
+        for i in range(appends):
+            append(make_row(worker * appends + i), path)
+
+    threads = [threading.Thread(target=work, args=(w,)) for w in range(writers)]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--writers", type=int, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--appends", type=int, default=200, help="appends per writer")
+    args = parser.parse_args()
+
+    print(f"{'writers':>8} | {'group rows/s':>13} | {'fsyncs':>7} | {'per-call rows/s':>16} | {'fsyncs':>7}")
+    print("-" * 64)
+    with tempfile.TemporaryDirectory() as tmp:
+        for writers in args.writers:
+            total = writers * args.appends
+
+            group = GroupCommitWriter()
+            elapsed = run_writers(group.append, Path(tmp) / f"group_{writers}.csv", writers, args.appends)
+            group_rate = total / elapsed
+
+            def per_call(row, path):
+                _append_records([row], path, fsync=True)
+
+            elapsed = run_writers(per_call, Path(tmp) / f"single_{writers}.csv", writers, args.appends)
+            single_rate = total / elapsed
+
+            print(f"{writers:>8} | {group_rate:>13,.0f} | {group.stats()['commits']:>7,} | "
+                  f"{single_rate:>16,.0f} | {total:>7,}")
+
+
+if __name__ == "__main__":
+    main()
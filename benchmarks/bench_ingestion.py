@@ -0,0 +1,155 @@
+"""Per-extractor ingestion benchmark over the synthetic course-material corpus.
+
+For every format and size in corpus.py it runs the format's extractor
+(extraction.EXTRACTORS) in a fresh process and reports throughput (MB/s and
+pages, slides or rows per second), peak Python allocations during one
+extraction (tracemalloc), the worker's peak RSS, extracted characters and
+chunk count. --full lifts the page/row/character budgets so the parsers see
+the whole file; --profile prints the functions with the most own time for
+each extractor on the largest size (under the default budgets); --csv
+appends the results with a timestamp so runs can be compared across
+extractor changes.
+
+Usage:
+    python benchmarks/bench_ingestion.py [--sizes 10 100 500] [--repeat 3] [--full]
+                                         [--profile 15] [--csv results.csv] [--corpus DIR]
+"""
+import argparse
+import cProfile
+import csv
+import io
+import json
+import os
+import pstats
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from documents import make_chunks  # noqa: E402
+from extraction import EXTRACTORS, iter_segments  # noqa: E402
+
+from corpus import HAS_XLWT, Corpus  # noqa: E402
+
+UNLIMITED_BUDGETS = {
+    "NUANSWERS_PDF_MAX_PAGES": str(10 ** 9),
+    "NUANSWERS_MAX_EXTRACTED_CHARS": str(10 ** 12),
+    "NUANSWERS_SHEET_MAX_ROWS": str(10 ** 9),
+}
+COLUMNS = ["format", "pages", "size_kb", "ms", "mb_per_s", "units", "units_per_s", "alloc_kb", "rss_kb", "chars", "chunks"]
+
+
+def worker(sample_path, repeat):
+    """Time repeat extractions of one sample in this process and print JSON"""
+    data = Path(sample_path).read_bytes()
+    extension = Path(sample_path).suffix
+    extract = EXTRACTORS[extension]
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        text = extract(io.BytesIO(data))
+        timings.append(time.perf_counter() - start)
+    # Allocations are traced in a separate run so tracing overhead stays out of the timings
+    tracemalloc.start()
+    extract(io.BytesIO(data))
+    alloc_bytes = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    segments = list(iter_segments(io.BytesIO(data), extension))
+    units = len({(sheet, number) for kind, number, sheet, _ in segments if kind != "note"})
+    print(json.dumps({"seconds": statistics.median(timings), "alloc_kb": alloc_bytes // 1024,
+                      "rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                      "chars": len(text), "units": units, "chunks": len(make_chunks(segments))}))
+
+
+def run_worker(sample_path, repeat, full):
+    env = {**os.environ, **UNLIMITED_BUDGETS} if full else None
+    output = subprocess.run(
+        [sys.executable, __file__, "--worker", str(sample_path), "--repeat", str(repeat)],
+        check=True, capture_output=True, text=True, env=env,
+    ).stdout
+    return json.loads(output)
+
+
+def profile(sample_path, top):
+    """Print the top functions (by own time) of one in-process extraction"""
+    data = Path(sample_path).read_bytes()
+    extract = EXTRACTORS[Path(sample_path).suffix]
+    profiler = cProfile.Profile()
+    profiler.runcall(extract, io.BytesIO(data))
+    print(f"\n== {Path(sample_path).name} ==")
+    pstats.Stats(profiler).strip_dirs().sort_stats("tottime").print_stats(top)
+
+
+def append_csv(path, rows):
+    path = Path(path)
+    new_file = not path.exists()
+    with path.open("a", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=["timestamp", "full"] + COLUMNS)
+        if new_file:
+            writer.writeheader()
+        writer.writerows(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 500], help="pages per file")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--full", action="store_true", help="disable the extraction budgets")
+    parser.add_argument("--profile", type=int, metavar="N", help="print the top N functions per extractor")
+    parser.add_argument("--csv", help="append results to this CSV file")
+    parser.add_argument("--corpus", help="keep the generated corpus in this directory")
+    parser.add_argument("--worker", metavar="SAMPLE", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.worker:
+        worker(args.worker, args.repeat)
+        return
+
+    if not HAS_XLWT:
+        print("xlwt is not installed; skipping .xls")
+    with tempfile.TemporaryDirectory() as tmp:
+        corpus_dir = Path(args.corpus or tmp)
+        samples = Corpus().write(corpus_dir, args.sizes)
+        print(f"{'format':>6} | {'pages':>5} | {'size KB':>8} | {'ms':>8} | {'MB/s':>6} | {'units':>6} | "
+              f"{'units/s':>8} | {'alloc KB':>8} | {'RSS KB':>8} | {'chars':>9} | {'chunks':>6}")
+        print("-" * 109)
+        rows = []
+        timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
+        for sample in samples:
+            size = sample.stat().st_size
+            result = run_worker(sample, args.repeat, args.full)
+            seconds = result["seconds"]
+            row = {
+                "format": sample.suffix,
+                "pages": int(sample.stem.split("_")[1].rstrip("p")),
+                "size_kb": round(size / 1024),
+                "ms": round(seconds * 1000, 1),
+                "mb_per_s": round(size / 1024 / 1024 / seconds, 2),
+                "units": result["units"],
+                "units_per_s": round(result["units"] / seconds),
+                "alloc_kb": result["alloc_kb"],
+                "rss_kb": result["rss_kb"],
+                "chars": result["chars"],
+                "chunks": result["chunks"],
+            }
+            rows.append({"timestamp": timestamp, "full": args.full, **row})
+            print(f"{row['format']:>6} | {row['pages']:>5} | {row['size_kb']:>8,} | {row['ms']:>8.1f} | "
+                  f"{row['mb_per_s']:>6.2f} | {row['units']:>6,} | {row['units_per_s']:>8,} | "
+                  f"{row['alloc_kb']:>8,} | {row['rss_kb']:>8,} | {row['chars']:>9,} | {row['chunks']:>6,}")
+        if args.csv:
+            append_csv(args.csv, rows)
+            print(f"Appended {len(rows)} rows to {args.csv}")
+        if args.profile:
+            largest = max(args.sizes)
+            for sample in samples:
+                if sample.stem.endswith(f"_{largest}p"):
+                    profile(sample, args.profile)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""Storage benchmark suite over synthetic NuAnswers datasets.
+
+For each dataset size it times the repository operations behind save_to_csv
+(appends to every table), find_account (index build and warm lookups) and
+the Admin page's load_data calls (cold, warm once a snapshot exists, and
+served from the repository's read cache), then prints one comparable table.
+--backend memory runs the same operations on the process-local backend, as
+a baseline for the repository's own overhead without any file I/O.
+
+Usage:
+    python benchmarks/bench_storage.py [--sizes 1000 100000 1000000] [--repeat 20] [--backend csv|memory]
+"""
+import argparse
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from repository import CsvBackend, MemoryBackend, Repository  # noqa: E402
+from storage import AccountIndex  # noqa: E402
+
+from synthetic import TABLES, SyntheticData  # noqa: E402
+
+ADMIN_TABLES = ["registration_data", "feedback_data", "topic_data", "completion_data"]
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return (time.perf_counter() - start) * 1000, result
+
+
+def median_ms(fn, calls):
+    return statistics.median(timed(fn, *args)[0] for args in calls)
+
+
+def bench_size(size, repeat, data_dir, backend="csv"):
+    """Return [(operation, milliseconds)] for one dataset size"""
+    generator = SyntheticData(size)
+    if backend == "memory":
+        memory = MemoryBackend()
+        for table in TABLES:
+            memory.append(table, [generator.row(table, i) for i in range(size)])
+        repo = Repository(memory)
+    else:
+        generator.write_all(data_dir)
+        repo = Repository(CsvBackend(data_dir))
+    results = []
+
+    for table in TABLES:
+        rows = [generator.row(table, size + i) for i in range(repeat)]
+        results.append((f"save_to_csv {table}", median_ms(repo.append_rows, [(row, table) for row in rows])))
+
+    students = [generator.student(generator.random.randrange(size)) for _ in range(repeat)]
+    logins = [(s["student_id"], s["student_email"].upper()) for s in students]
+    if backend == "memory":
+        results.append(("find_account (warm)", median_ms(repo.find_account, logins)))
+    else:
+        index = AccountIndex(data_dir / "accounts.csv")
+        build_ms, _ = timed(index.lookup, "0000000", "nobody@fdu.edu")
+        results.append(("find_account (index build)", build_ms))
+        results.append(("find_account (warm)", median_ms(index.lookup, logins)))
+
+    for table in ADMIN_TABLES:
+        if backend == "memory":
+            results.append((f"load_data {table} (cold)", timed(repo.backend.read, table)[0]))
+        else:
+            cold_ms, _ = timed(CsvBackend(data_dir).read, table)
+            warm_ms, _ = timed(CsvBackend(data_dir).read, table)
+            results.append((f"load_data {table} (cold)", cold_ms))
+            results.append((f"load_data {table} (snapshot)", warm_ms))
+        repo.read(table)
+        results.append((f"load_data {table} (cached)", median_ms(repo.read, [(table,)] * repeat)))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 100000, 1000000])
+    parser.add_argument("--repeat", type=int, default=20, help="calls per timed operation")
+    parser.add_argument("--backend", choices=["csv", "memory"], default="csv")
+    args = parser.parse_args()
+
+    table = {}
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            for operation, ms in bench_size(size, args.repeat, Path(tmp), args.backend):
+                table.setdefault(operation, {})[size] = ms
+
+    width = max(len(operation) for operation in table)
+    print(f"{'operation (ms)':<{width}} | " + " | ".join(f"{size:>12,}" for size in args.sizes))
+    print("-" * (width + 15 * len(args.sizes)))
+    for operation, timings in table.items():
+        print(f"{operation:<{width}} | " + " | ".join(f"{timings[size]:>12.3f}" for size in args.sizes))
+
+
+if __name__ == "__main__":
+    main()
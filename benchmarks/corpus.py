@@ -0,0 +1,167 @@
+"""Synthetic course-material corpus for ingestion benchmarks.
+
+Builds PDF, DOCX, PPTX, XLSX, XLS and CSV files shaped like real uploads
+(lecture notes, slide decks, gradebook/trial-balance exports) with a given
+number of pages. Tabular formats get LINES_PER_PAGE rows per page. XLS
+needs the optional xlwt package and is skipped without it.
+
+Usage:
+    python benchmarks/corpus.py OUTPUT_DIR [--sizes 10 100 500] [--seed 0]
+"""
+import argparse
+import io
+import random
+from pathlib import Path
+
+import docx
+import openpyxl
+import pptx
+
+try:
+    import xlwt
+    HAS_XLWT = True
+except ImportError:
+    HAS_XLWT = False
+
+LINES_PER_PAGE = 40
+WORDS = (
+    "asset liability equity revenue expense debit credit journal ledger accrual deferral depreciation "
+    "amortization inventory receivable payable dividend retained earnings cash flow statement balance "
+    "sheet income ratio liquidity solvency margin present value future annuity interest rate bond coupon "
+    "yield maturity discount premium capital budget variance cost allocation overhead"
+).split()
+ACCOUNTS = ["Cash", "Accounts Receivable", "Inventory", "Equipment", "Accounts Payable", "Revenue", "Wages Expense"]
+
+
+class Corpus:
+    """Deterministic generator of upload files"""
+
+    def __init__(self, seed=0):
+        self.random = random.Random(seed)
+
+    def sentence(self, i):
+        words = self.random.choices(WORDS, k=12)
+        return f"{i}. {' '.join(words).capitalize()} of ${self.random.randint(100, 99999):,}.00."
+
+    def lines(self, pages):
+        return [self.sentence(i) for i in range(pages * LINES_PER_PAGE)]
+
+    def rows(self, pages):
+        yield ["date", "account", "debit", "credit", "memo"]
+        for i in range(pages * LINES_PER_PAGE):
+            amount = round(self.random.uniform(10, 50000), 2)
+            debit = self.random.random() < 0.5
+            yield [f"2025-{i % 12 + 1:02d}-{i % 28 + 1:02d}", self.random.choice(ACCOUNTS),
+                   amount if debit else 0.0, 0.0 if debit else amount, self.sentence(i)]
+
+    def pdf(self, pages):
+        """A text PDF written directly (no third-party PDF writer needed)"""
+        lines = self.lines(pages)
+        objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None,
+                   b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+        kids = []
+        for p in range(pages):
+            page_lines = lines[p * LINES_PER_PAGE:(p + 1) * LINES_PER_PAGE]
+            escaped = [line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)") for line in page_lines]
+            stream = ("BT /F1 9 Tf 40 800 Td 12 TL " + " ".join(f"({line}) '" for line in escaped) + " ET").encode("latin-1")
+            objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+            content_id = len(objects)
+            objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 842] "
+                           b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_id)
+            kids.append(len(objects))
+        objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+            b" ".join(b"%d 0 R" % kid for kid in kids), len(kids))
+        out = io.BytesIO()
+        out.write(b"%PDF-1.4\n")
+        offsets = []
+        for number, body in enumerate(objects, start=1):
+            offsets.append(out.tell())
+            out.write(b"%d 0 obj\n%s\nendobj\n" % (number, body))
+        xref = out.tell()
+        out.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+        for offset in offsets:
+            out.write(b"%010d 00000 n \n" % offset)
+        out.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref))
+        return out.getvalue()
+
+    def docx(self, pages):
+        document = docx.Document()
+        for p in range(pages):
+            document.add_heading(f"Section {p + 1}", level=2)
+            for line in self.lines(1):
+                document.add_paragraph(line)
+        out = io.BytesIO()
+        document.save(out)
+        return out.getvalue()
+
+    def pptx(self, pages):
+        presentation = pptx.Presentation()
+        for p in range(pages):
+            slide = presentation.slides.add_slide(presentation.slide_layouts[1])
+            slide.shapes.title.text = f"Lecture slide {p + 1}"
+            slide.placeholders[1].text = "\n".join(self.sentence(i) for i in range(8))
+        out = io.BytesIO()
+        presentation.save(out)
+        return out.getvalue()
+
+    def csv(self, pages):
+        out = io.StringIO()
+        for row in self.rows(pages):
+            out.write(",".join(f'"{value}"' if isinstance(value, str) else f"{value:.2f}" for value in row) + "\n")
+        return out.getvalue().encode("utf-8")
+
+    def xlsx(self, pages):
+        workbook = openpyxl.Workbook(write_only=True)
+        sheet = workbook.create_sheet("Trial Balance")
+        for row in self.rows(pages):
+            sheet.append(row)
+        out = io.BytesIO()
+        workbook.save(out)
+        return out.getvalue()
+
+    def xls(self, pages):
+        workbook = xlwt.Workbook()
+        # XLS sheets hold at most 65536 rows
+        sheet = workbook.add_sheet("Trial Balance")
+        for r, row in enumerate(self.rows(min(pages, 65535 // LINES_PER_PAGE))):
+            for c, value in enumerate(row):
+                sheet.write(r, c, value)
+        out = io.BytesIO()
+        workbook.save(out)
+        return out.getvalue()
+
+    def formats(self):
+        """Extension -> builder for every format this environment can generate"""
+        builders = {".pdf": self.pdf, ".docx": self.docx, ".pptx": self.pptx,
+                    ".csv": self.csv, ".xlsx": self.xlsx}
+        if HAS_XLWT:
+            builders[".xls"] = self.xls
+        return builders
+
+    def write(self, output_dir, sizes):
+        """Write one file per format and size into output_dir; returns the paths"""
+        output_dir = Path(output_dir)
+        output_dir.mkdir(parents=True, exist_ok=True)
+        paths = []
+        for extension, build in self.formats().items():
+            for pages in sizes:
+                path = output_dir / f"{extension.lstrip('.')}_{pages}p{extension}"
+                path.write_bytes(build(pages))
+                paths.append(path)
+        return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("output_dir")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 500], help="pages per file")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    paths = Corpus(args.seed).write(args.output_dir, args.sizes)
+    if not HAS_XLWT:
+        print("xlwt is not installed; skipped .xls files")
+    print(f"Wrote {len(paths)} files to {args.output_dir}")
+
+
+if __name__ == "__main__":
+    main()
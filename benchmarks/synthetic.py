@@ -0,0 +1,133 @@
+"""Synthetic NuAnswers datasets with the same columns the app writes.
+
+Usage:
+    python benchmarks/synthetic.py OUTPUT_DIR [--rows 100000] [--seed 0]
+"""
+import argparse
+import csv
+import random
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from partitions import is_partitioned, partition_dir  # noqa: E402
+from schemas import CAMPUSES, CONTENT_TYPES, GRADES, MAJORS, columns  # noqa: E402
+
+TABLES = [
+    "registration_data", "accounts", "feedback_data", "topic_data",
+    "completion_data", "response_times", "content_access",
+]
+
+COURSE_PREFIXES = ["ACCT", "ECON", "FIN", "MIS", "WMA"]
+TOPICS = [
+    "Accounting equation", "Journal entries", "Depreciation", "Ratio analysis",
+    "Time value of money", "Bond pricing", "Cash flow statement", "Inventory costing",
+]
+PROFESSORS = [f"Professor {name}" for name in ["Adams", "Baker", "Chen", "Diaz", "Evans", "Fischer", "Garcia"]]
+START = datetime(2024, 8, 26)
+
+
+class SyntheticData:
+    """Deterministic generator of rows for every NuAnswers table"""
+
+    def __init__(self, rows, seed=0, students=None, days=730):
+        self.rows = rows
+        self.random = random.Random(seed)
+        self.students = students or max(10, rows // 10)
+        self.days = days
+        self.courses = [f"{self.random.choice(COURSE_PREFIXES)}_{self.random.randint(1000, 4999)}_"
+                        f"{self.random.randint(1, 20):02d}" for _ in range(60)]
+
+    def timestamp(self, i):
+        # Rows are spread evenly over the time span in timestamp order, like a real log
+        offset = timedelta(seconds=int(i * self.days * 86400 / max(1, self.rows)))
+        return (START + offset).strftime("%Y-%m-%d %H:%M:%S")
+
+    def student(self, n):
+        return {
+            "full_name": f"Student {n}",
+            "student_id": f"{1000000 + n:07d}",
+            "student_email": f"student{n}@student.fdu.edu",
+            "grade": GRADES[n % len(GRADES)],
+            "campus": CAMPUSES[n % len(CAMPUSES)],
+            "major": MAJORS[n % len(MAJORS)],
+        }
+
+    def row(self, table, i):
+        """Return row i of table as a dict"""
+        r = self.random
+        if table == "accounts":
+            return self.student(i)
+        course_id = r.choice(self.courses)
+        timestamp = self.timestamp(i)
+        if table == "registration_data":
+            professor = r.choice(PROFESSORS)
+            return {
+                "timestamp": timestamp,
+                **self.student(r.randrange(self.students)),
+                "course_name": f"Course {course_id}",
+                "course_id": course_id,
+                "professor": professor,
+                "professor_email": f"{professor.split()[-1].lower()}@fdu.edu",
+                "usage_time_minutes": round(r.expovariate(1 / 20), 4),
+            }
+        if table == "feedback_data":
+            return {"timestamp": timestamp, "course_id": course_id, "rating": r.randint(1, 5),
+                    "topic": r.choice(TOPICS), "difficulty": r.randint(1, 5)}
+        if table == "topic_data":
+            return {"timestamp": timestamp, "course_id": course_id,
+                    "topic": r.choice(TOPICS), "difficulty": r.randint(1, 5)}
+        if table == "completion_data":
+            return {"timestamp": timestamp, "course_id": course_id, "completed": r.random() < 0.8}
+        if table == "response_times":
+            return {"timestamp": timestamp, "response_time": round(r.lognormvariate(1.2, 0.5), 4),
+                    "user_id": f"Student {r.randrange(self.students)}"}
+        if table == "content_access":
+            return {"timestamp": timestamp, "content_id": f"{r.choice(TOPICS)}.pdf",
+                    "content_type": r.choice(CONTENT_TYPES), "user_id": f"Student {r.randrange(self.students)}"}
+        raise ValueError(f"Unknown table: {table}")
+
+    def write_table(self, table, data_dir):
+        """Write rows of table into data_dir using the app's file layout; returns files written"""
+        path = Path(data_dir) / f"{table}.csv"
+        fields = columns(table)
+        handles = {}
+        try:
+            for i in range(self.rows):
+                row = self.row(table, i)
+                target = path
+                if is_partitioned(path):
+                    target = partition_dir(path) / f"{row['timestamp'][:7]}.csv"
+                if target not in handles:
+                    target.parent.mkdir(parents=True, exist_ok=True)
+                    f = open(target, "w", newline="", encoding="utf-8")
+                    writer = csv.DictWriter(f, fieldnames=fields)
+                    writer.writeheader()
+                    handles[target] = (f, writer)
+                handles[target][1].writerow(row)
+        finally:
+            for f, _ in handles.values():
+                f.close()
+        return list(handles)
+
+    def write_all(self, data_dir):
+        """Write every table into data_dir"""
+        for table in TABLES:
+            self.write_table(table, data_dir)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("output_dir")
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    Path(args.output_dir).mkdir(parents=True, exist_ok=True)
+    SyntheticData(args.rows, seed=args.seed).write_all(args.output_dir)
+    print(f"Wrote {args.rows:,} rows per table to {args.output_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""Token budget for the chat completion request.
+
+Every component of the request (system prompt, document excerpts, chat
+turns) is counted with the model's tokenizer before sending (tiktoken when
+installed, otherwise documents.estimate_tokens) and the request is filled
+in priority order until PROMPT_TOKEN_BUDGET is spent:
+
+1. the system prompt (always sent)
+2. the RECENT_TURNS latest messages (the latest one is always sent)
+3. retrieved document excerpts, best first
+4. older turns, newest first
+
+Messages keep their chronological order in the request. The per-request
+breakdown is logged at debug level; the Admin page shows the averages and
+the RECENT_BREAKDOWNS latest breakdowns.
+"""
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+from documents import estimate_tokens
+
+try:
+    import tiktoken
+    HAS_TIKTOKEN = True
+except ImportError:
+    HAS_TIKTOKEN = False
+
+logger = logging.getLogger(__name__)
+
+CHAT_MODEL = "gpt-4.1"
+PROMPT_TOKEN_BUDGET = int(os.environ.get("NUANSWERS_PROMPT_TOKENS", "12000"))
+RECENT_TURNS = 6
+RECENT_BREAKDOWNS = 20
+# Per-message framing tokens the chat format adds around each message's content, and before the reply
+MESSAGE_OVERHEAD = 4
+REPLY_OVERHEAD = 3
+
+_encoding = None
+_encoding_lock = threading.Lock()
+
+
+def _get_encoding():
+    """The model's tiktoken encoding, or None to fall back to the estimate"""
+    global _encoding, HAS_TIKTOKEN
+    with _encoding_lock:
+        if _encoding is None and HAS_TIKTOKEN:
+            try:
+                _encoding = tiktoken.encoding_for_model(CHAT_MODEL)
+            except KeyError:
+                _encoding = tiktoken.get_encoding("o200k_base")
+            except Exception as e:
+                # The encoding file is downloaded on first use; without it the estimate is used
+                logger.warning("tiktoken encoding unavailable, estimating tokens: %s", e)
+                HAS_TIKTOKEN = False
+        return _encoding
+
+
+def count_tokens(text):
+    encoding = _get_encoding()
+    if encoding is None:
+        return estimate_tokens(text)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def message_tokens(message):
+    return count_tokens(message["content"]) + MESSAGE_OVERHEAD
+
+
+def build_messages(system_prompt, messages, excerpts=(), context_header="", budget=PROMPT_TOKEN_BUDGET):
+    """Return (request messages, breakdown) for the chat completion request.
+
+    excerpts are formatted document excerpts, best first; the ones that fit
+    are joined under context_header into a second system message. The
+    breakdown has the tokens spent per component and what was dropped.
+    """
+    breakdown = {"budget": budget, "system": 0, "recent": 0, "context": 0, "older": 0,
+                 "excerpts": 0, "excerpts_dropped": 0, "turns_dropped": 0}
+    system = {"role": "system", "content": system_prompt}
+    breakdown["system"] = message_tokens(system)
+    remaining = budget - breakdown["system"] - REPLY_OVERHEAD
+
+    turns = [{"role": m["role"], "content": m["content"]} for m in messages]
+    keep = [False] * len(turns)
+    recent_start = max(0, len(turns) - RECENT_TURNS)
+    for index in range(len(turns) - 1, recent_start - 1, -1):
+        cost = message_tokens(turns[index])
+        if cost > remaining and index != len(turns) - 1:
+            break
+        keep[index] = True
+        breakdown["recent"] += cost
+        remaining -= cost
+
+    included = []
+    context_cost = count_tokens(context_header) + MESSAGE_OVERHEAD if excerpts else 0
+    for excerpt in excerpts:
+        cost = count_tokens(excerpt) + 1
+        if context_cost + cost > remaining:
+            breakdown["excerpts_dropped"] += 1
+            continue
+        included.append(excerpt)
+        context_cost += cost
+    if included:
+        breakdown["context"] = context_cost
+        breakdown["excerpts"] = len(included)
+        remaining -= context_cost
+
+    # Older turns fill what is left, newest first, and only behind a complete recent window
+    # so the conversation stays contiguous
+    older_start = recent_start if all(keep[recent_start:]) else 0
+    for index in range(older_start - 1, -1, -1):
+        cost = message_tokens(turns[index])
+        if cost > remaining:
+            break
+        keep[index] = True
+        breakdown["older"] += cost
+        remaining -= cost
+    breakdown["turns_dropped"] = keep.count(False)
+
+    request = [system]
+    if included:
+        request.append({"role": "system", "content": context_header + "\n\n".join(included)})
+    request += [turn for turn, kept in zip(turns, keep) if kept]
+    breakdown["total"] = breakdown["system"] + breakdown["recent"] + breakdown["context"] + breakdown["older"] \
+        + REPLY_OVERHEAD
+    logger.debug("Prompt tokens: %(total)d of %(budget)d (system %(system)d, recent turns %(recent)d, "
+                "context %(context)d in %(excerpts)d excerpts, older turns %(older)d; dropped "
+                "%(excerpts_dropped)d excerpts and %(turns_dropped)d turns)", breakdown)
+    _stats.record(breakdown)
+    return request, breakdown
+
+
+class PromptBudgetStats:
+    """Running totals of request breakdowns (shared by every session in the process)"""
+
+    COMPONENTS = ("system", "recent", "context", "older")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.over_budget = 0
+        self.totals = dict.fromkeys(self.COMPONENTS + ("total",), 0)
+        self.dropped_turns = 0
+        self.dropped_excerpts = 0
+        self._recent = deque(maxlen=RECENT_BREAKDOWNS)
+
+    def record(self, breakdown):
+        with self._lock:
+            self._recent.append({"time": time.strftime("%H:%M:%S"), **breakdown})
+            self.requests += 1
+            self.over_budget += breakdown["total"] > breakdown["budget"]
+            for key in self.totals:
+                self.totals[key] += breakdown[key]
+            self.dropped_turns += breakdown["turns_dropped"]
+            self.dropped_excerpts += breakdown["excerpts_dropped"]
+
+    def stats(self):
+        with self._lock:
+            requests = self.requests or 1
+            return {
+                "requests": self.requests,
+                "over_budget": self.over_budget,
+                "tokenizer": "tiktoken" if HAS_TIKTOKEN else "estimate",
+                **{f"avg_{key}_tokens": self.totals[key] / requests for key in self.totals},
+                "dropped_turns": self.dropped_turns,
+                "dropped_excerpts": self.dropped_excerpts,
+                "recent": list(reversed(self._recent)),
+            }
+
+
+_stats = PromptBudgetStats()
+
+
+def prompt_budget_stats():
+    return _stats.stats()
@@ -0,0 +1,144 @@
+"""Chunked representation of uploaded documents.
+
+An uploaded document is a dict with its name, upload file_id and a list of
+chunks. Each chunk is a dict holding a slice of the extracted text plus its
+provenance:
+
+- kind: "page" (PDF), "slide" (PPTX), "paragraph" (DOCX), "row" (CSV/Excel),
+  "line" (TXT) or "image"
+- start/end: first and last page, slide, paragraph, row or line number
+- sheet: worksheet name for Excel rows (None otherwise)
+- chars/tokens: size of the chunk's text
+
+Search and prompt building work on chunks, so they can select or skip
+parts of a document instead of copying whole documents on every rerun.
+"""
+import hashlib
+
+# Target chunk size; consecutive small segments are merged up to this size
+CHUNK_CHARS = 2000
+
+
+def estimate_tokens(text):
+    """Approximate token count (about four characters per token for English text)"""
+    return (len(text) + 3) // 4
+
+
+def new_chunk(text, kind, start=None, end=None, sheet=None):
+    return {
+        "text": text,
+        "kind": kind,
+        "start": start,
+        "end": end,
+        "sheet": sheet,
+        "chars": len(text),
+        "tokens": estimate_tokens(text),
+    }
+
+
+def make_chunks(segments, max_chars=CHUNK_CHARS):
+    """Group (kind, number, sheet, text) segments into chunks of about max_chars.
+
+    Chunks never span two sheets. A segment longer than max_chars is split
+    into several chunks that share its number. "note" segments (sheet
+    headers, truncation markers) are attached to the surrounding chunk.
+    """
+    chunks = []
+    texts, kind, start, end, size = [], None, None, None, 0
+    sheet = None
+
+    def flush():
+        nonlocal texts, kind, start, end, size
+        if any(texts):
+            chunks.append(new_chunk("\n".join(texts), kind or "note", start, end, sheet))
+        texts, kind, start, end, size = [], None, None, None, 0
+
+    for segment_kind, number, segment_sheet, text in segments:
+        if segment_sheet != sheet:
+            flush()
+            sheet = segment_sheet
+        if segment_kind == "note":
+            texts.append(text)
+            size += len(text) + 1
+            continue
+        for offset in range(0, max(len(text), 1), max_chars):
+            piece = text[offset:offset + max_chars]
+            if kind is not None and size + len(piece) > max_chars:
+                flush()
+            kind = kind or segment_kind
+            start = number if start is None else start
+            end = number
+            texts.append(piece)
+            size += len(piece) + 1
+    flush()
+    return chunks
+
+
+def chunk_label(chunk):
+    """Human-readable provenance, e.g. "pages 3-4" or "Sheet1 rows 1-120" """
+    kind = chunk["kind"]
+    if kind in ("image", "note") or chunk["start"] is None:
+        return kind
+    if chunk["start"] == chunk["end"]:
+        label = f"{kind} {chunk['start']}"
+    else:
+        label = f"{kind}s {chunk['start']}-{chunk['end']}"
+    if chunk["sheet"]:
+        label = f"{chunk['sheet']} {label}"
+    return label
+
+
+def new_document(name, chunks, file_id=None, is_image=False, **extra):
+    """Build the session-state entry for an uploaded document"""
+    return {
+        "name": name,
+        "file_id": file_id,
+        "is_image": is_image,
+        "chunks": chunks,
+        "chars": sum(chunk["chars"] for chunk in chunks),
+        "tokens": sum(chunk["tokens"] for chunk in chunks),
+        **extra,
+    }
+
+
+def document_text(document):
+    """The document's full extracted text"""
+    return "\n".join(chunk["text"] for chunk in document["chunks"])
+
+
+def fingerprint(data):
+    """Content fingerprint of uploaded bytes"""
+    return hashlib.sha256(data).hexdigest()
+
+
+class UploadRegistry:
+    """Uploads already handled in this session, for O(1) membership checks on every rerun.
+
+    Uploader file_ids are remembered even after their document is deleted, so
+    a file still sitting in the uploader is not ingested again. Content
+    fingerprints map to the document name and are released on delete or
+    failure, so the same content can be uploaded again later.
+    """
+
+    def __init__(self):
+        self._file_ids = set()
+        self._fingerprints = {}
+
+    def __len__(self):
+        return len(self._fingerprints)
+
+    def is_known(self, file_id):
+        return file_id in self._file_ids
+
+    def register(self, file_id, data, name):
+        """Record an upload; returns (fingerprint, name of the earlier document with the same content or None)"""
+        self._file_ids.add(file_id)
+        key = fingerprint(data)
+        duplicate_of = self._fingerprints.get(key)
+        if duplicate_of is None:
+            self._fingerprints[key] = name
+        return key, duplicate_of
+
+    def forget(self, key):
+        """Release a fingerprint (its document was deleted or failed to ingest)"""
+        self._fingerprints.pop(key, None)
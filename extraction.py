@@ -0,0 +1,428 @@
+"""Text extraction for uploaded course materials.
+
+Every format has a segment generator that parses its input lazily and
+yields one page, slide, paragraph, row or line at a time; extraction stops
+at the page, row and character budgets below. Segments are either joined
+into plain text or grouped into chunks (documents.make_chunks).
+
+Extractors take a path or a binary file-like object, so uploads are parsed
+straight from memory (io.BytesIO over UploadedFile.getvalue()) and never
+written to a temporary file.
+
+Extraction results are cached by the SHA-256 of the uploaded bytes, so a file
+uploaded by many students (the same syllabus or lecture deck) is parsed
+once per process and, through the on-disk store, once per deployment.
+"""
+import csv
+import hashlib
+import io
+import json
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import docx
+import openpyxl
+import pptx
+import PyPDF2
+import xlrd
+
+from documents import make_chunks
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever an extractor's output changes so stale cache entries are ignored
+EXTRACTOR_VERSION = 4
+
+# Only part of a long document is ever usable as chat context, so parsing stops at these budgets
+PDF_MAX_PAGES = int(os.environ.get("NUANSWERS_PDF_MAX_PAGES", "300"))
+MAX_EXTRACTED_CHARS = int(os.environ.get("NUANSWERS_MAX_EXTRACTED_CHARS", "500000"))
+SHEET_MAX_ROWS = int(os.environ.get("NUANSWERS_SHEET_MAX_ROWS", "5000"))
+SHEET_MAX_COLUMNS = int(os.environ.get("NUANSWERS_SHEET_MAX_COLUMNS", "50"))
+
+
+def iter_pdf_pages(source):
+    """Yield (page_number, page_count, text) one page at a time"""
+    pdf_reader = PyPDF2.PdfReader(source)
+    if pdf_reader.is_encrypted:
+        # Many PDFs are encrypted only to restrict printing/editing and open with an empty password
+        pdf_reader.decrypt("")
+    page_count = len(pdf_reader.pages)
+    for number, page in enumerate(pdf_reader.pages, start=1):
+        yield number, page_count, page.extract_text() or ""
+
+
+# Segment generators yield (kind, number, sheet, text) tuples in document order;
+# documents.make_chunks groups them into chunks that keep this provenance.
+
+def pdf_segments(source, max_pages=PDF_MAX_PAGES, progress=None):
+    """One segment per page, stopping after max_pages; progress(done, total) is called per page"""
+    for number, page_count, text in iter_pdf_pages(source):
+        if progress is not None:
+            progress(number, min(page_count, max_pages))
+        yield "page", number, None, text
+        if number >= max_pages and number < page_count:
+            yield "note", number, None, f"[Truncated: extracted {number} of {page_count} pages]"
+            return
+
+
+def docx_segments(source):
+    for number, paragraph in enumerate(docx.Document(source).paragraphs, start=1):
+        yield "paragraph", number, None, paragraph.text
+
+
+def pptx_segments(source):
+    for number, slide in enumerate(pptx.Presentation(source).slides, start=1):
+        yield "slide", number, None, "\n".join(shape.text for shape in slide.shapes if hasattr(shape, "text"))
+
+
+def txt_segments(source):
+    with _open_text(source, newline=None) as f:
+        for number, line in enumerate(f, start=1):
+            yield "line", number, None, line.rstrip("\n")
+
+
+def _cell_text(value):
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value).replace("\t", " ").replace("\n", " ")
+
+
+def _row_segments(sheet_name, rows, max_rows, max_columns):
+    """Tab-separated rows (trailing empty cells dropped, blank rows skipped), at most max_rows"""
+    if sheet_name is not None:
+        yield "note", None, sheet_name, f"Sheet: {sheet_name}"
+    count = 0
+    for number, row in enumerate(rows, start=1):
+        if count >= max_rows:
+            yield "note", number, sheet_name, f"[Truncated: first {max_rows} rows]"
+            return
+        cells = [_cell_text(value) for value in row[:max_columns]]
+        while cells and not cells[-1]:
+            cells.pop()
+        if not cells:
+            continue
+        count += 1
+        yield "row", number, sheet_name, "\t".join(cells)
+
+
+def iter_csv_rows(source):
+    with _open_text(source) as f:
+        yield from csv.reader(f)
+
+
+def csv_segments(source, max_rows=SHEET_MAX_ROWS, max_columns=SHEET_MAX_COLUMNS):
+    yield from _row_segments(None, iter_csv_rows(source), max_rows, max_columns)
+
+
+def iter_xlsx_sheets(source, max_columns=SHEET_MAX_COLUMNS):
+    """Yield (sheet_name, row iterator) from an XLSX workbook opened in read-only (streaming) mode"""
+    workbook = openpyxl.load_workbook(source, read_only=True, data_only=True)
+    try:
+        for worksheet in workbook.worksheets:
+            yield worksheet.title, worksheet.iter_rows(max_col=max_columns, values_only=True)
+    finally:
+        workbook.close()
+
+
+def _xls_rows(book, sheet, max_columns):
+    for r in range(sheet.nrows):
+        row = []
+        for cell in sheet.row_slice(r, 0, min(sheet.ncols, max_columns)):
+            if cell.ctype == xlrd.XL_CELL_DATE:
+                row.append(xlrd.xldate.xldate_as_datetime(cell.value, book.datemode))
+            elif cell.ctype in (xlrd.XL_CELL_EMPTY, xlrd.XL_CELL_BLANK):
+                row.append(None)
+            else:
+                row.append(cell.value)
+        yield row
+
+
+def iter_xls_sheets(source, max_columns=SHEET_MAX_COLUMNS):
+    """Yield (sheet_name, row iterator) from an XLS workbook, loading one sheet at a time"""
+    if isinstance(source, (str, os.PathLike)):
+        book = xlrd.open_workbook(source, on_demand=True)
+    else:
+        book = xlrd.open_workbook(file_contents=source.read(), on_demand=True)
+    try:
+        for sheet_name in book.sheet_names():
+            sheet = book.sheet_by_name(sheet_name)
+            yield sheet_name, _xls_rows(book, sheet, max_columns)
+            book.unload_sheet(sheet_name)
+    finally:
+        book.release_resources()
+
+
+def _is_ole2(source):
+    """True for legacy .xls (OLE2 compound file) content"""
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as f:
+            header = f.read(8)
+    else:
+        position = source.tell()
+        header = source.read(8)
+        source.seek(position)
+    return header == b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1"
+
+
+def excel_segments(source, max_rows=SHEET_MAX_ROWS, max_columns=SHEET_MAX_COLUMNS):
+    sheets = iter_xls_sheets(source, max_columns) if _is_ole2(source) else iter_xlsx_sheets(source, max_columns)
+    for sheet_name, rows in sheets:
+        yield from _row_segments(sheet_name, rows, max_rows, max_columns)
+
+
+def _open_text(source, newline=""):
+    """Open a path or binary stream as UTF-8 text"""
+    if isinstance(source, (str, os.PathLike)):
+        return open(source, "r", encoding="utf-8", newline=newline)
+    return io.TextIOWrapper(source, encoding="utf-8", newline=newline)
+
+
+SEGMENTERS = {
+    ".pdf": pdf_segments,
+    ".docx": docx_segments,
+    ".txt": txt_segments,
+    ".pptx": pptx_segments,
+    ".csv": csv_segments,
+    ".xls": excel_segments,
+    ".xlsx": excel_segments,
+}
+
+# Segmenters that parse page by page and accept a progress(done, total) callback
+PAGED_EXTENSIONS = {".pdf"}
+
+
+def iter_segments(source, extension, progress=None, max_chars=MAX_EXTRACTED_CHARS):
+    """Yield the segments of source, stopping once max_chars of text have been produced"""
+    extension = extension.lower()
+    segmenter = SEGMENTERS.get(extension)
+    if segmenter is None:
+        raise ValueError(f"Unsupported file type: {extension}")
+    if progress is not None and extension in PAGED_EXTENSIONS:
+        segments = segmenter(source, progress=progress)
+    else:
+        segments = segmenter(source)
+    chars = 0
+    for kind, number, sheet, text in segments:
+        if chars + len(text) > max_chars:
+            yield kind, number, sheet, text[:max_chars - chars]
+            yield "note", number, sheet, "[Truncated: character budget reached]"
+            segments.close()
+            return
+        chars += len(text) + 1
+        yield kind, number, sheet, text
+
+
+def extract_text(source, extension, progress=None):
+    """Extracted text of source; segments are collected and joined once (linear in the output size)"""
+    return "\n".join(segment[3] for segment in iter_segments(source, extension, progress))
+
+
+def extract_chunks(source, extension, progress=None):
+    """Extracted text of source as provenance-carrying chunks (see documents.py)"""
+    return make_chunks(iter_segments(source, extension, progress))
+
+
+def extract_text_from_pdf(source, progress=None):
+    return extract_text(source, ".pdf", progress)
+
+
+def extract_text_from_docx(source):
+    return extract_text(source, ".docx")
+
+
+def extract_text_from_pptx(source):
+    return extract_text(source, ".pptx")
+
+
+def extract_text_from_csv(source):
+    return extract_text(source, ".csv")
+
+
+def extract_text_from_excel(source):
+    return extract_text(source, ".xlsx")
+
+
+def extract_text_from_txt(source):
+    return extract_text(source, ".txt")
+
+
+EXTRACTORS = {
+    ".pdf": extract_text_from_pdf,
+    ".docx": extract_text_from_docx,
+    ".txt": extract_text_from_txt,
+    ".pptx": extract_text_from_pptx,
+    ".csv": extract_text_from_csv,
+    ".xls": extract_text_from_excel,
+    ".xlsx": extract_text_from_excel,
+}
+
+
+def extract_text_from_bytes(data, extension, progress=None):
+    """Extract text from an upload's bytes in memory; raises ValueError for unsupported types"""
+    # BytesIO over immutable bytes shares the buffer until written to, so the upload is not copied
+    return extract_text(io.BytesIO(data), extension, progress)
+
+
+def extract_chunks_from_bytes(data, extension, progress=None):
+    """Extract chunks from an upload's bytes in memory; raises ValueError for unsupported types"""
+    return extract_chunks(io.BytesIO(data), extension, progress)
+
+
+def content_key(data, extension):
+    """Cache key for uploaded bytes handled by the extractor for extension"""
+    digest = hashlib.sha256(data).hexdigest()
+    return f"{digest}-{extension.lstrip('.').lower()}-v{EXTRACTOR_VERSION}"
+
+
+class ExtractionCache:
+    """Content-addressed cache of extraction results (text, or chunks serialized as JSON).
+
+    Recently used entries are kept in memory (LRU, bounded by max_memory_bytes);
+    every entry is also written to directory, which is trimmed to max_disk_bytes
+    by evicting the least recently used files.
+    """
+
+    def __init__(self, directory, max_memory_bytes=64 * 1024 * 1024, max_disk_bytes=512 * 1024 * 1024):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        self._disk_bytes = sum(path.stat().st_size for path in self.directory.glob("*.txt"))
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _path(self, key):
+        return self.directory / f"{key}.txt"
+
+    def _remember(self, key, text):
+        # Caller holds self._lock
+        size = len(text)
+        if key in self._memory:
+            self._memory_bytes -= len(self._memory.pop(key))
+        if size > self.max_memory_bytes:
+            return
+        self._memory[key] = text
+        self._memory_bytes += size
+        while self._memory_bytes > self.max_memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+
+    def get(self, key):
+        """Return cached text for key, or None"""
+        with self._lock:
+            text = self._memory.get(key)
+            if text is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return text
+        path = self._path(key)
+        try:
+            text = path.read_text(encoding="utf-8")
+            # mtime doubles as the disk store's LRU clock
+            os.utime(path)
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.disk_hits += 1
+            self._remember(key, text)
+        return text
+
+    def put(self, key, text):
+        """Store text for key in memory and on disk"""
+        with self._lock:
+            self._remember(key, text)
+        path = self._path(key)
+        encoded = text.encode("utf-8")
+        if len(encoded) > self.max_disk_bytes:
+            return
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(encoded)
+            previous = path.stat().st_size if path.exists() else 0
+            os.replace(tmp_path, path)
+        except OSError:
+            logger.exception("Failed to write extraction cache entry %s", key)
+            return
+        with self._lock:
+            self._disk_bytes += len(encoded) - previous
+            if self._disk_bytes > self.max_disk_bytes:
+                self._trim_disk()
+
+    def _trim_disk(self):
+        # Caller holds self._lock; drop least recently used files until under the cap
+        entries = []
+        for path in self.directory.glob("*.txt"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, path))
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            total -= size
+        self._disk_bytes = total
+
+    def stats(self):
+        """Return hit/miss counters and current sizes"""
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_bytes,
+                "disk_bytes": self._disk_bytes,
+            }
+
+
+_extraction_cache = None
+_extraction_cache_lock = threading.Lock()
+
+
+def get_extraction_cache(directory):
+    """Return the process-wide ExtractionCache (shared by every session)"""
+    global _extraction_cache
+    with _extraction_cache_lock:
+        if _extraction_cache is None:
+            _extraction_cache = ExtractionCache(directory)
+        return _extraction_cache
+
+
+def extraction_cache_stats():
+    """Return the shared cache's counters (all zero if it has not been used)"""
+    if _extraction_cache is None:
+        return {"hits": 0, "disk_hits": 0, "misses": 0, "hit_rate": 0.0,
+                "memory_entries": 0, "memory_bytes": 0, "disk_bytes": 0}
+    return _extraction_cache.stats()
+
+
+def get_cached_chunks(cache, key):
+    """Return the chunks cached under key, or None"""
+    text = cache.get(key)
+    return json.loads(text) if text is not None else None
+
+
+def put_cached_chunks(cache, key, chunks):
+    cache.put(key, json.dumps(chunks))
@@ -0,0 +1,166 @@
+"""Preparation and caching of uploaded images before vision analysis.
+
+Images are analyzed once per distinct content: results are cached by the
+SHA-256 of the uploaded bytes (in memory and under the cache directory),
+so a re-upload, or the same worksheet photo from another student, never
+reaches the vision model again. Images that do need analysis are
+downscaled to the resolution the vision model actually uses (capped at
+IMAGE_MAX_SIDE) and re-encoded as JPEG within IMAGE_MAX_BYTES before
+base64 encoding.
+"""
+import hashlib
+import io
+import math
+import threading
+import time
+
+from extraction import ExtractionCache
+
+try:
+    from PIL import Image, ImageOps
+    HAS_PIL = True
+except ImportError:
+    HAS_PIL = False
+
+# Bump when the analysis prompt or model changes so cached analyses are not reused
+ANALYSIS_VERSION = 1
+
+IMAGE_MAX_SIDE = 1536
+IMAGE_MAX_BYTES = 512 * 1024
+JPEG_QUALITIES = (85, 75, 65, 50)
+
+
+def image_key(data):
+    return f"{hashlib.sha256(data).hexdigest()}-image-v{ANALYSIS_VERSION}"
+
+
+def vision_size(width, height):
+    """Size the vision model resizes a high-detail image to (within 2048x2048, short side at most 768)"""
+    scale = min(1.0, 2048 / max(width, height))
+    scale *= min(1.0, 768 / (min(width, height) * scale))
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def vision_tokens(width, height):
+    """Input tokens the vision model charges for a high-detail image of this size"""
+    width, height = vision_size(width, height)
+    return 85 + 170 * math.ceil(width / 512) * math.ceil(height / 512)
+
+
+def _sniff_mime(data):
+    return "image/png" if data.startswith(b"\x89PNG") else "image/jpeg"
+
+
+def prepare_image(data, max_side=IMAGE_MAX_SIDE, max_bytes=IMAGE_MAX_BYTES):
+    """Downscale and re-encode image bytes as JPEG; returns (image_bytes, info)"""
+    info = {"original_bytes": len(data), "prepared_bytes": len(data), "original_tokens": None, "tokens": None,
+            "mime": _sniff_mime(data)}
+    if not HAS_PIL:
+        return data, info
+    try:
+        image = Image.open(io.BytesIO(data))
+        image.load()
+    except OSError:
+        # Not decodable here; let the vision model see the original bytes
+        return data, info
+    with image:
+        image = ImageOps.exif_transpose(image)
+        info["original_tokens"] = vision_tokens(*image.size)
+        if image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info):
+            # JPEG has no alpha; flatten onto white so dark content on a transparent background stays visible
+            rgba = image.convert("RGBA")
+            image = Image.new("RGB", rgba.size, "white")
+            image.paste(rgba, mask=rgba.getchannel("A"))
+        elif image.mode != "RGB":
+            image = image.convert("RGB")
+        # Pixels beyond what the model keeps after its own resize are never seen, so drop them here
+        image.thumbnail(vision_size(*image.size), Image.LANCZOS)
+        image.thumbnail((max_side, max_side), Image.LANCZOS)
+        info["tokens"] = vision_tokens(*image.size)
+        for quality in JPEG_QUALITIES:
+            out = io.BytesIO()
+            image.save(out, format="JPEG", quality=quality, optimize=True)
+            if out.tell() <= max_bytes:
+                break
+    prepared = out.getvalue()
+    if len(prepared) >= len(data) and info["tokens"] == info["original_tokens"]:
+        # Already small enough; sending the original avoids a needless quality loss
+        return data, info
+    info["prepared_bytes"] = len(prepared)
+    info["mime"] = "image/jpeg"
+    return prepared, info
+
+
+class ImagePipelineStats:
+    """Counters for analyzed images (shared by every session in the process)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.analyzed = 0
+        self.cache_hits = 0
+        self.bytes_saved = 0
+        self.tokens_saved = 0
+        self.seconds = 0.0
+
+    def record(self, cached, info=None, seconds=0.0):
+        with self._lock:
+            if cached:
+                self.cache_hits += 1
+                return
+            self.analyzed += 1
+            self.seconds += seconds
+            self.bytes_saved += info["original_bytes"] - info["prepared_bytes"]
+            if info["tokens"] is not None:
+                self.tokens_saved += info["original_tokens"] - info["tokens"]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "analyzed": self.analyzed,
+                "cache_hits": self.cache_hits,
+                "bytes_saved": self.bytes_saved,
+                "tokens_saved": self.tokens_saved,
+                "avg_seconds": self.seconds / self.analyzed if self.analyzed else 0.0,
+            }
+
+
+_image_cache = None
+_image_cache_lock = threading.Lock()
+_stats = ImagePipelineStats()
+
+
+def get_image_cache(directory):
+    """Return the process-wide cache of image analyses"""
+    global _image_cache
+    with _image_cache_lock:
+        if _image_cache is None:
+            _image_cache = ExtractionCache(directory, max_memory_bytes=4 * 1024 * 1024,
+                                           max_disk_bytes=32 * 1024 * 1024)
+        return _image_cache
+
+
+def image_pipeline_stats():
+    return _stats.stats()
+
+
+def analyze_image_cached(data, analyze, cache):
+    """Return (analysis, info) for image bytes.
+
+    analyze(image_bytes, mime) calls the vision model and is only invoked on
+    a cache miss, with the downscaled image. info reports whether the cache was hit,
+    the bytes and estimated tokens before/after preparation and the latency.
+    """
+    key = image_key(data)
+    analysis = cache.get(key)
+    if analysis is not None:
+        _stats.record(cached=True)
+        return analysis, {"cached": True}
+    prepared, info = prepare_image(data)
+    start = time.perf_counter()
+    analysis = analyze(prepared, info["mime"])
+    info["seconds"] = time.perf_counter() - start
+    info["cached"] = False
+    if analysis:
+        cache.put(key, analysis)
+        _stats.record(cached=False, info=info, seconds=info["seconds"])
+    return analysis, info
@@ -0,0 +1,299 @@
+"""Parallel extraction of uploaded files in worker processes.
+
+Each new upload is parsed in its own child process (at most max_workers at
+a time), under a wall-clock timeout and an address-space budget. A parse
+that runs over either budget is killed without affecting the other files
+or the Streamlit script thread. Results come back in upload order.
+
+IngestionJobQueue runs uploads as background jobs (queued -> running ->
+done/failed) so the Streamlit script never waits for them; the page polls
+job status and picks up finished documents.
+"""
+import itertools
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from collections import deque
+from multiprocessing.connection import wait
+from pathlib import Path
+
+from extraction import content_key, extract_chunks_from_bytes, get_cached_chunks, put_cached_chunks
+from triage import check_document
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+INGEST_TIMEOUT = 60.0
+INGEST_MEMORY_LIMIT = 1024 * 1024 * 1024
+INGEST_WORKERS = max(1, min(4, os.cpu_count() or 1))
+
+_context = None
+
+
+def _get_context():
+    """Children fork from a server that has already imported the parsers, so they start fast"""
+    global _context
+    if _context is None:
+        if "forkserver" in multiprocessing.get_all_start_methods():
+            _context = multiprocessing.get_context("forkserver")
+            _context.set_forkserver_preload(["extraction", "triage"])
+        else:
+            _context = multiprocessing.get_context("spawn")
+    return _context
+
+
+def _limit_memory(budget):
+    """Cap this process's address space at its current size plus budget bytes"""
+    if resource is None or not budget:
+        return
+    try:
+        with open("/proc/self/statm") as f:
+            current = int(f.read().split()[0]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        current = 0
+    limit = current + budget
+    resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+def _extract_worker(conn, data, extension, memory_limit):
+    try:
+        _limit_memory(memory_limit)
+        # Parser-based triage (PDF page tree, XLS globals) runs here, under the worker's limits
+        check_document(data, extension)
+        chunks = extract_chunks_from_bytes(data, extension,
+                                           progress=lambda done, total: conn.send(("progress", (done, total))))
+        conn.send(("ok", chunks))
+    except MemoryError:
+        conn.send(("error", "memory budget exceeded"))
+    except Exception as e:
+        conn.send(("error", str(e)))
+    finally:
+        conn.close()
+
+
+def _result(name, status, chunks=None, error=None, seconds=0.0):
+    return {"name": name, "status": status, "chunks": chunks, "error": error, "seconds": seconds}
+
+
+def extract_in_processes(uploads, timeout=INGEST_TIMEOUT, memory_limit=INGEST_MEMORY_LIMIT,
+                         max_workers=INGEST_WORKERS, progress=None):
+    """Extract chunks (see documents.py) from [(name, data)] concurrently.
+
+    Returns one dict per upload, in the same order, with status "ok", "error"
+    or "timeout", the extracted chunks (or None), an error message and the
+    wall-clock seconds spent. Paged formats call progress(name, done, total)
+    as each page is parsed.
+    """
+    context = _get_context()
+    results = [None] * len(uploads)
+    pending = list(range(len(uploads)))
+    running = {}  # receiving connection -> (index, process, started)
+
+    def finish(conn, status, chunks=None, error=None):
+        index, process, started = running.pop(conn)
+        conn.close()
+        process.join(1.0)
+        if process.is_alive():
+            process.kill()
+            process.join()
+        if status == "error" and error is None:
+            # The child died without reporting (e.g. killed by the OS for memory)
+            error = f"worker exited unexpectedly (exit code {process.exitcode})"
+        results[index] = _result(uploads[index][0], status, chunks, error, time.monotonic() - started)
+
+    while pending or running:
+        while pending and len(running) < max_workers:
+            index = pending.pop(0)
+            name, data = uploads[index]
+            receiver, sender = context.Pipe(duplex=False)
+            process = context.Process(target=_extract_worker, name=f"ingest-{name}",
+                                      args=(sender, data, Path(name).suffix.lower(), memory_limit), daemon=True)
+            process.start()
+            sender.close()
+            running[receiver] = (index, process, time.monotonic())
+
+        now = time.monotonic()
+        next_deadline = min(started + timeout for _, _, started in running.values())
+        ready = wait(list(running), timeout=max(0.0, next_deadline - now))
+        for conn in ready:
+            try:
+                status, payload = conn.recv()
+            except EOFError:
+                finish(conn, "error")
+                continue
+            if status == "progress":
+                if progress is not None:
+                    progress(uploads[running[conn][0]][0], *payload)
+            elif status == "ok":
+                finish(conn, "ok", chunks=payload)
+            else:
+                finish(conn, "error", error=payload)
+
+        now = time.monotonic()
+        for conn, (index, process, started) in list(running.items()):
+            if now - started >= timeout:
+                process.kill()
+                logger.warning("Killed extraction of %s after %gs", uploads[index][0], timeout)
+                finish(conn, "timeout", error=f"timed out after {timeout:g}s")
+    return results
+
+
+def extract_uploads(uploads, cache=None, timeout=INGEST_TIMEOUT, memory_limit=INGEST_MEMORY_LIMIT,
+                    max_workers=INGEST_WORKERS, progress=None):
+    """Extract [(name, data)] in upload order, reusing cached chunks and parsing only the misses in parallel"""
+    results = [None] * len(uploads)
+    misses = []
+    for index, (name, data) in enumerate(uploads):
+        extension = Path(name).suffix.lower()
+        chunks = get_cached_chunks(cache, content_key(data, extension)) if cache is not None else None
+        if chunks is not None:
+            results[index] = _result(name, "ok", chunks)
+        else:
+            misses.append(index)
+    parsed = extract_in_processes([uploads[index] for index in misses], timeout, memory_limit, max_workers, progress)
+    for index, result in zip(misses, parsed):
+        results[index] = result
+        if cache is not None and result["status"] == "ok" and result["chunks"]:
+            name, data = uploads[index]
+            put_cached_chunks(cache, content_key(data, Path(name).suffix.lower()), result["chunks"])
+    return results
+
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+
+class IngestionJob:
+    """One upload processed in the background; work(progress) returns the job's result"""
+
+    def __init__(self, job_id, name, kind, work):
+        self.id = job_id
+        self.name = name
+        self.kind = kind
+        self.work = work
+        self.status = JOB_QUEUED
+        self.result = None
+        self.error = None
+        self.progress = None
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+
+    def set_progress(self, done, total):
+        self.progress = (done, total)
+
+    @property
+    def is_finished(self):
+        return self.status in (JOB_DONE, JOB_FAILED)
+
+    def summary(self):
+        """Timing of this job for the Admin page"""
+        started = self.started or time.time()
+        return {
+            "job": self.id,
+            "name": self.name,
+            "kind": self.kind,
+            "status": self.status,
+            "submitted": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.submitted)),
+            "wait_seconds": round(started - self.submitted, 3),
+            "run_seconds": round((self.finished or time.time()) - started, 3) if self.started else 0.0,
+            "error": self.error,
+        }
+
+
+class IngestionJobQueue:
+    """Background threads running ingestion jobs; finished jobs are kept in a bounded history"""
+
+    def __init__(self, workers=INGEST_WORKERS, history=200):
+        self._queue = queue.Queue()
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._active = {}
+        self._history = deque(maxlen=history)
+        self._threads = [threading.Thread(target=self._run, name=f"ingest-job-{n}", daemon=True)
+                         for n in range(workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, name, kind, work):
+        """Queue work(progress) for an upload and return its IngestionJob"""
+        job = IngestionJob(next(self._ids), name, kind, work)
+        with self._lock:
+            self._active[job.id] = job
+        self._queue.put(job)
+        return job
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            job.status = JOB_RUNNING
+            job.started = time.time()
+            try:
+                job.result = job.work(job.set_progress)
+                job.status = JOB_DONE
+            except Exception as e:
+                logger.warning("Ingestion job %s (%s) failed: %s", job.id, job.name, e)
+                job.error = str(e)
+                job.status = JOB_FAILED
+            finally:
+                job.finished = time.time()
+                job.work = None
+                with self._lock:
+                    self._active.pop(job.id, None)
+                    self._history.append(job)
+
+    def stats(self):
+        """Job counts by state, average wait/run time and the recent jobs"""
+        with self._lock:
+            jobs = list(self._active.values()) + list(self._history)
+        finished = [job for job in jobs if job.is_finished]
+        counts = {state: 0 for state in (JOB_QUEUED, JOB_RUNNING, JOB_DONE, JOB_FAILED)}
+        for job in jobs:
+            counts[job.status] += 1
+        return {
+            **counts,
+            "avg_wait_seconds": sum(job.started - job.submitted for job in finished) / len(finished) if finished else 0.0,
+            "avg_run_seconds": sum(job.finished - job.started for job in finished) / len(finished) if finished else 0.0,
+            "jobs": [job.summary() for job in sorted(jobs, key=lambda job: job.id, reverse=True)],
+        }
+
+
+def extraction_work(name, data, cache=None):
+    """Job work that extracts one document in a worker process; raises if extraction fails"""
+    def work(progress):
+        result = extract_uploads([(name, data)], cache=cache,
+                                 progress=lambda _name, done, total: progress(done, total))[0]
+        if result["status"] != "ok":
+            raise RuntimeError(result["error"])
+        return result["chunks"]
+    return work
+
+
+_job_queue = None
+_job_queue_lock = threading.Lock()
+
+
+def get_ingestion_queue():
+    """Return the process-wide IngestionJobQueue"""
+    global _job_queue
+    with _job_queue_lock:
+        if _job_queue is None:
+            _job_queue = IngestionJobQueue()
+        return _job_queue
+
+
+def ingestion_job_stats():
+    """Return the shared queue's job stats (empty if no job was submitted yet)"""
+    if _job_queue is None:
+        return {JOB_QUEUED: 0, JOB_RUNNING: 0, JOB_DONE: 0, JOB_FAILED: 0,
+                "avg_wait_seconds": 0.0, "avg_run_seconds": 0.0, "jobs": []}
+    return _job_queue.stats()
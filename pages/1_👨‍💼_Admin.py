@@ -6,8 +6,15 @@ import plotly.graph_objects as go
 from datetime import datetime, timedelta
 import calendar
 import numpy as np
-from pathlib import Path
 import io
+from storage import write_behind_stats
+from extraction import extraction_cache_stats
+from images import image_pipeline_stats
+from ingestion import ingestion_job_stats
+from triage import triage_stats
+from budget import prompt_budget_stats
+from retrieval import retrieval_stats
+from repository import COMPLETION_TABLE, FEEDBACK_TABLE, REGISTRATION_TABLE, TOPIC_TABLE, get_repository
 
 # Set page config
 st.set_page_config(
@@ -188,23 +195,21 @@ if st.button("🗑️ Clear API Cost Data"):
     }
     st.success("API cost data cleared successfully!")
 
-# Configure data directory
-DATA_DIR = Path("/data" if os.path.exists("/data") else ".")
-REGISTRATION_DATA_PATH = DATA_DIR / "registration_data.csv"
-FEEDBACK_DATA_PATH = DATA_DIR / "feedback_data.csv"
-TOPIC_DATA_PATH = DATA_DIR / "topic_data.csv"
-COMPLETION_DATA_PATH = DATA_DIR / "completion_data.csv"
+# Shared repository (same backend and read cache as the student app)
+repo = get_repository()
 
-def load_data(filepath):
-    """Load data from CSV file with error handling"""
+def load_data(table, start=None, end=None):
+    """Load a table (optionally within a date range) with error handling"""
     try:
-        if filepath.exists():
-            return pd.read_csv(filepath)
-        return pd.DataFrame()
+        return repo.read(table, start=start, end=end)
     except Exception as e:
-        st.error(f"Error loading data from {filepath}: {str(e)}")
+        st.error(f"Error loading data from {table}: {str(e)}")
         return pd.DataFrame()
 
+def clear_data(table):
+    """Delete all rows of a table"""
+    repo.clear(table)
+
 # Add download section
 def create_download_section():
     """Create download section for all data"""
@@ -214,10 +219,10 @@ def create_download_section():
     
     # Prepare all data
     all_data = {
-        "Registration Data": load_data(REGISTRATION_DATA_PATH),
-        "Feedback Data": load_data(FEEDBACK_DATA_PATH),
-        "Topic Data": load_data(TOPIC_DATA_PATH),
-        "Completion Data": load_data(COMPLETION_DATA_PATH)
+        "Registration Data": load_data(REGISTRATION_TABLE),
+        "Feedback Data": load_data(FEEDBACK_TABLE),
+        "Topic Data": load_data(TOPIC_TABLE),
+        "Completion Data": load_data(COMPLETION_TABLE)
     }
     
     # Create Excel file with multiple sheets
@@ -251,10 +256,10 @@ def create_download_section():
 
 try:
     # Load all data
-    df = load_data(REGISTRATION_DATA_PATH)
-    feedback_df = load_data(FEEDBACK_DATA_PATH)
-    topic_df = load_data(TOPIC_DATA_PATH)
-    completion_df = load_data(COMPLETION_DATA_PATH)
+    df = load_data(REGISTRATION_TABLE)
+    feedback_df = load_data(FEEDBACK_TABLE)
+    topic_df = load_data(TOPIC_TABLE)
+    completion_df = load_data(COMPLETION_TABLE)
     
     # Add download section at the top
     create_download_section()
@@ -306,7 +311,6 @@ try:
     
     with tab1:
         if not df.empty:
-            df['timestamp'] = pd.to_datetime(df['timestamp'])
             daily_stats = df.groupby(df['timestamp'].dt.date).agg({
                 'student_id': 'count',
                 'usage_time_minutes': ['sum', 'mean']
@@ -458,7 +462,7 @@ try:
     if not df.empty:
         # Grade level progression
         grade_order = ['Freshman', 'Sophomore', 'Junior', 'Senior', 'Graduate']
-        grade_usage = df.groupby(['grade', 'major']).agg({
+        grade_usage = df.groupby(['grade', 'major'], observed=True).agg({
             'student_id': 'count',
             'usage_time_minutes': 'mean'
         }).reset_index()
@@ -513,7 +517,7 @@ try:
                 st.metric("Average Completion Rate", f"{completion_rate:.1f}%")
                 
                 # Completion by course
-                course_completion = completion_df.groupby('course_id')['completed'].mean() * 100
+                course_completion = completion_df.groupby('course_id', observed=True)['completed'].mean() * 100
                 fig_completion = px.bar(x=course_completion.index, 
                                       y=course_completion.values,
                                       title='Completion Rates by Course',
@@ -569,21 +573,21 @@ try:
     col1, col2 = st.columns(2)
     
     with col1:
-        # Campus distribution
-        campus_dist = df['campus'].value_counts()
+        # Categorical columns count every known level, so levels without rows are dropped
+        campus_dist = df['campus'].value_counts()[lambda counts: counts > 0]
         fig_campus = px.pie(values=campus_dist.values, names=campus_dist.index,
                            title='Distribution by Campus')
         st.plotly_chart(fig_campus)
         
     with col2:
         # Major distribution
-        major_dist = df['major'].value_counts()
+        major_dist = df['major'].value_counts()[lambda counts: counts > 0]
         fig_major = px.pie(values=major_dist.values, names=major_dist.index,
                           title='Distribution by Major')
         st.plotly_chart(fig_major)
     
     # Grade Level Analysis
-    grade_dist = df['grade'].value_counts()
+    grade_dist = df['grade'].value_counts()[lambda counts: counts > 0]
     fig_grade = px.bar(x=grade_dist.index, y=grade_dist.values,
                        title='Distribution by Grade Level')
     st.plotly_chart(fig_grade, use_container_width=True)
@@ -592,14 +596,15 @@ try:
     st.subheader("🔄 Cross Analysis")
     
     # Major vs Grade Level
-    major_grade_dist = pd.crosstab(df['major'], df['grade'])
+    major_grade_dist = pd.crosstab(df['major'].cat.remove_unused_categories(),
+                                   df['grade'].cat.remove_unused_categories())
     fig_major_grade = px.imshow(major_grade_dist,
                                title='Major vs Grade Level Distribution',
                                aspect='auto')
     st.plotly_chart(fig_major_grade, use_container_width=True)
     
     # Usage Patterns by Major
-    major_usage = df.groupby('major').agg({
+    major_usage = df.groupby('major', observed=True).agg({
         'usage_time_minutes': ['mean', 'count']
     }).reset_index()
     major_usage.columns = ['Major', 'Avg Minutes', 'Session Count']
@@ -628,6 +633,90 @@ try:
     
     # System Performance Metrics
     st.subheader("⚙️ System Performance")
+
+    # Background telemetry writer counters
+    writer_stats = write_behind_stats()
+    queue_col1, queue_col2, queue_col3 = st.columns(3)
+    with queue_col1:
+        st.metric("Telemetry Queue Depth", writer_stats["queue_depth"])
+    with queue_col2:
+        st.metric("Telemetry Rows Written", f"{writer_stats['written']:,}")
+    with queue_col3:
+        st.metric("Telemetry Rows Dropped", writer_stats["dropped"] + writer_stats["failed"])
+
+    # Upload text-extraction cache counters (shared by every session in this process)
+    cache_stats = extraction_cache_stats()
+    cache_col1, cache_col2, cache_col3 = st.columns(3)
+    with cache_col1:
+        st.metric("Extraction Cache Hit Rate", f"{cache_stats['hit_rate']:.0%}")
+    with cache_col2:
+        st.metric("Extraction Cache Hits (memory / disk)", f"{cache_stats['hits']:,} / {cache_stats['disk_hits']:,}")
+    with cache_col3:
+        st.metric("Extraction Cache Misses", f"{cache_stats['misses']:,}")
+
+    # Image analysis pipeline (cached analyses and downscaling before the vision call)
+    image_stats = image_pipeline_stats()
+    image_col1, image_col2, image_col3, image_col4 = st.columns(4)
+    with image_col1:
+        st.metric("Images Analyzed / Reused", f"{image_stats['analyzed']:,} / {image_stats['cache_hits']:,}")
+    with image_col2:
+        st.metric("Image Upload Saved", f"{image_stats['bytes_saved'] / (1024 * 1024):,.1f} MB")
+    with image_col3:
+        st.metric("Image Tokens Saved", f"{image_stats['tokens_saved']:,}")
+    with image_col4:
+        st.metric("Avg Image Analysis Time", f"{image_stats['avg_seconds']:.1f} s")
+
+    # Background ingestion jobs (document extraction and image analysis)
+    job_stats = ingestion_job_stats()
+    job_col1, job_col2, job_col3, job_col4 = st.columns(4)
+    with job_col1:
+        st.metric("Ingestion Jobs Queued / Running", f"{job_stats['queued']} / {job_stats['running']}")
+    with job_col2:
+        st.metric("Ingestion Jobs Done / Failed", f"{job_stats['done']:,} / {job_stats['failed']:,}")
+    with job_col3:
+        st.metric("Avg Job Wait", f"{job_stats['avg_wait_seconds']:.2f} s")
+    with job_col4:
+        st.metric("Avg Job Run Time", f"{job_stats['avg_run_seconds']:.2f} s")
+    # Pre-extraction triage of uploads (rejected before reaching a worker, or capped by the budgets)
+    upload_triage = triage_stats()
+    triage_col1, triage_col2, triage_col3 = st.columns(3)
+    with triage_col1:
+        st.metric("Uploads Triaged / Rejected", f"{upload_triage['checked']:,} / {upload_triage['rejected']:,}")
+    with triage_col2:
+        st.metric("Uploads Capped by Budgets", f"{upload_triage['capped']:,}")
+    with triage_col3:
+        st.metric("Avg Triage Time", f"{upload_triage['avg_ms']:.1f} ms")
+    # Chat request token budget (where prompt tokens go per request)
+    budget_stats = prompt_budget_stats()
+    budget_col1, budget_col2, budget_col3, budget_col4 = st.columns(4)
+    with budget_col1:
+        st.metric(f"Avg Prompt Tokens ({budget_stats['tokenizer']})", f"{budget_stats['avg_total_tokens']:,.0f}")
+    with budget_col2:
+        st.metric("Avg Context / Turn Tokens",
+                  f"{budget_stats['avg_context_tokens']:,.0f} / "
+                  f"{budget_stats['avg_recent_tokens'] + budget_stats['avg_older_tokens']:,.0f}")
+    with budget_col3:
+        st.metric("Turns / Excerpts Dropped", f"{budget_stats['dropped_turns']:,} / {budget_stats['dropped_excerpts']:,}")
+    with budget_col4:
+        st.metric("Requests Over Budget", f"{budget_stats['over_budget']:,} of {budget_stats['requests']:,}")
+    if budget_stats["recent"]:
+        with st.expander("Recent prompt token breakdowns"):
+            st.dataframe(pd.DataFrame(budget_stats["recent"]), use_container_width=True)
+    # Document retrieval queries (chat context selection and the search box)
+    query_stats = retrieval_stats()
+    retrieval_col1, retrieval_col2, retrieval_col3 = st.columns(3)
+    with retrieval_col1:
+        st.metric("BM25 Queries / Avg Latency",
+                  f"{query_stats['bm25']['queries']:,} / {query_stats['bm25']['avg_ms']:.2f} ms")
+    with retrieval_col2:
+        st.metric("TF-IDF Queries / Avg Latency",
+                  f"{query_stats['tfidf']['queries']:,} / {query_stats['tfidf']['avg_ms']:.2f} ms")
+    with retrieval_col3:
+        st.metric("Document Searches / Avg Latency",
+                  f"{query_stats['search']['queries']:,} / {query_stats['search']['avg_ms']:.2f} ms")
+    if job_stats["jobs"]:
+        with st.expander("Recent ingestion jobs"):
+            st.dataframe(pd.DataFrame(job_stats["jobs"]), use_container_width=True)
     
     # Create columns for different metrics
     perf_col1, perf_col2 = st.columns(2)
@@ -726,7 +815,7 @@ try:
             
             with content_col2:
                 # Content type distribution
-                content_types = content_access['content_type'].value_counts()
+                content_types = content_access['content_type'].value_counts()[lambda counts: counts > 0]
                 fig_types = px.pie(values=content_types.values, names=content_types.index,
                                   title='Content Type Distribution')
                 st.plotly_chart(fig_types, use_container_width=True)
@@ -1122,9 +1211,8 @@ try:
     with col2:
         end_date = st.date_input("End Date", value=df['timestamp'].max().date())
     
-    # Filter data based on selected date range
-    filtered_df = df[(df['timestamp'].dt.date >= start_date) & 
-                    (df['timestamp'].dt.date <= end_date)]
+    # Filter data based on selected date range (reads only the matching partitions/index range)
+    filtered_df = load_data(REGISTRATION_TABLE, start=start_date, end=end_date)
     
     if not filtered_df.empty:
         # Display filtered metrics
@@ -1238,19 +1326,19 @@ try:
     with tab1:
         col1, col2 = st.columns(2)
         with col1:
-            course_dist = df['course_name'].value_counts().head(10)
+            course_dist = df['course_name'].value_counts()[lambda counts: counts > 0].head(10)
             fig_course = px.bar(x=course_dist.index, y=course_dist.values,
                                title='Top 10 Most Common Courses')
             st.plotly_chart(fig_course, use_container_width=True)
         
         with col2:
-            course_id_dist = df['course_id'].value_counts().head(10)
+            course_id_dist = df['course_id'].value_counts()[lambda counts: counts > 0].head(10)
             fig_course_id = px.bar(x=course_id_dist.index, y=course_id_dist.values,
                                   title='Top 10 Course IDs')
             st.plotly_chart(fig_course_id, use_container_width=True)
     
     with tab2:
-        prof_dist = df['professor'].value_counts()
+        prof_dist = df['professor'].value_counts()[lambda counts: counts > 0]
         fig_prof = px.pie(values=prof_dist.values, names=prof_dist.index,
                          title='Distribution by Professor')
         st.plotly_chart(fig_prof, use_container_width=True)
@@ -1258,10 +1346,9 @@ try:
     # Raw Data Section with enhanced filtering
     st.subheader("📝 Raw Registration Data")
     
-    # Use a copy with datetime timestamp for date filter/sort (avoid float/str errors)
-    df_ts = df.copy()
+    # Timestamps are already parsed by the schema; drop rows whose timestamp was unparseable
+    df_ts = df
     if 'timestamp' in df_ts.columns and not df_ts.empty:
-        df_ts['timestamp'] = pd.to_datetime(df_ts['timestamp'], errors='coerce')
         df_ts = df_ts.dropna(subset=['timestamp'])
     
     # Filters
@@ -1308,15 +1395,14 @@ try:
             default=[]
         )
     
-    # Apply filters (use df_ts so timestamp is datetime)
-    filtered_df = df_ts.copy()
-    
+    # Apply filters (use datetime timestamps); a date range only reads the matching partitions
     if len(date_range) == 2:
         start_date, end_date = date_range
-        filtered_df = filtered_df[
-            (filtered_df['timestamp'].dt.date >= start_date) & 
-            (filtered_df['timestamp'].dt.date <= end_date)
-        ]
+        filtered_df = load_data(REGISTRATION_TABLE, start=start_date, end=end_date)
+        if not filtered_df.empty:
+            filtered_df = filtered_df.dropna(subset=['timestamp'])
+    else:
+        filtered_df = df_ts.copy()
     
     if selected_majors:
         filtered_df = filtered_df[filtered_df['major'].isin(selected_majors)]
@@ -1376,8 +1462,7 @@ try:
             col1, col2 = st.columns(2)
             if col1.button("Yes, Clear Registration Data", key="confirm_reg"):
                 try:
-                    if REGISTRATION_DATA_PATH.exists():
-                        REGISTRATION_DATA_PATH.unlink()
+                    clear_data(REGISTRATION_TABLE)
                     st.success("Registration data cleared successfully!")
                 except Exception as e:
                     st.error(f"Error clearing registration data: {str(e)}")
@@ -1396,8 +1481,7 @@ try:
             col1, col2 = st.columns(2)
             if col1.button("Yes, Clear Feedback Data", key="confirm_feed"):
                 try:
-                    if FEEDBACK_DATA_PATH.exists():
-                        FEEDBACK_DATA_PATH.unlink()
+                    clear_data(FEEDBACK_TABLE)
                     st.success("Feedback data cleared successfully!")
                 except Exception as e:
                     st.error(f"Error clearing feedback data: {str(e)}")
@@ -1416,8 +1500,7 @@ try:
             col1, col2 = st.columns(2)
             if col1.button("Yes, Clear Topic Data", key="confirm_topic"):
                 try:
-                    if TOPIC_DATA_PATH.exists():
-                        TOPIC_DATA_PATH.unlink()
+                    clear_data(TOPIC_TABLE)
                     st.success("Topic data cleared successfully!")
                 except Exception as e:
                     st.error(f"Error clearing topic data: {str(e)}")
@@ -1436,8 +1519,7 @@ try:
             col1, col2 = st.columns(2)
             if col1.button("Yes, Clear Completion Data", key="confirm_comp"):
                 try:
-                    if COMPLETION_DATA_PATH.exists():
-                        COMPLETION_DATA_PATH.unlink()
+                    clear_data(COMPLETION_TABLE)
                     st.success("Completion data cleared successfully!")
                 except Exception as e:
                     st.error(f"Error clearing completion data: {str(e)}")
@@ -1459,9 +1541,8 @@ try:
             if col1.button("Yes, Clear ALL Data", key="confirm_all"):
                 try:
                     # Clear all data files
-                    for path in [REGISTRATION_DATA_PATH, FEEDBACK_DATA_PATH, TOPIC_DATA_PATH, COMPLETION_DATA_PATH]:
-                        if path.exists():
-                            path.unlink()
+                    for table in [REGISTRATION_TABLE, FEEDBACK_TABLE, TOPIC_TABLE, COMPLETION_TABLE]:
+                        clear_data(table)
                     st.success("All data cleared successfully!")
                 except Exception as e:
                     st.error(f"Error clearing all data: {str(e)}")
@@ -0,0 +1,156 @@
+"""Monthly partitioning of the fastest-growing CSV logs.
+
+Rows for a partitioned table are appended to <DATA_DIR>/<table>/<YYYY-MM>.csv
+based on their timestamp, so date-range reads only open the months they
+need. Rows of an older single-file log (<DATA_DIR>/<table>.csv) are still
+read; move them into partitions once with:
+
+    python partitions.py split [--data-dir /data]
+"""
+import argparse
+import os
+import re
+import shutil
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+import pandas as pd
+
+from snapshots import load_csvs, remove_snapshot
+from storage import append_rows, get_file_lock, rows_to_records
+
+PARTITIONED_TABLES = {"registration_data", "response_times", "content_access"}
+
+_MONTH_RE = re.compile(r"^\d{4}-\d{2}$")
+
+
+def is_partitioned(filepath):
+    """Return True if rows for filepath are sharded into monthly files"""
+    return Path(filepath).stem in PARTITIONED_TABLES
+
+
+def partition_dir(filepath):
+    """Directory holding the monthly partitions of filepath"""
+    return Path(filepath).parent / Path(filepath).stem
+
+
+def _month_of(timestamp):
+    """Return the YYYY-MM partition key of a timestamp string/date, or None"""
+    if isinstance(timestamp, (date, datetime)):
+        return timestamp.strftime("%Y-%m")
+    month = str(timestamp or "")[:7]
+    return month if _MONTH_RE.match(month) else None
+
+
+def append_partitioned(data, filepath):
+    """Append rows to the monthly partition matching each row's timestamp"""
+    by_month = {}
+    for record in rows_to_records(data):
+        by_month.setdefault(_month_of(record.get("timestamp")), []).append(record)
+    for month, records in by_month.items():
+        if month is None:
+            # Rows without a usable timestamp stay in the unpartitioned file
+            append_rows(records, filepath)
+            continue
+        partition = partition_dir(filepath)
+        partition.mkdir(exist_ok=True)
+        append_rows(records, partition / f"{month}.csv")
+
+
+def _month_start(value):
+    return date(value.year, value.month, 1)
+
+
+def partition_files(filepath, start=None, end=None):
+    """List the CSV files that may hold rows in [start, end] (dates, inclusive)"""
+    files = []
+    if Path(filepath).exists():
+        files.append(Path(filepath))
+    partition = partition_dir(filepath)
+    if not partition.is_dir():
+        return files
+    first = _month_start(start) if start is not None else None
+    last = _month_start(end) if end is not None else None
+    for path in sorted(partition.glob("*.csv")):
+        if not _MONTH_RE.match(path.stem):
+            continue
+        month = date(int(path.stem[:4]), int(path.stem[5:7]), 1)
+        if (first is None or month >= first) and (last is None or month <= last):
+            files.append(path)
+    return files
+
+
+def filter_by_date(df, start=None, end=None):
+    """Keep rows whose timestamp date is within [start, end] (either bound may be None)"""
+    if (start is None and end is None) or "timestamp" not in df.columns:
+        return df
+    mask = pd.Series(True, index=df.index)
+    if start is not None:
+        mask &= df["timestamp"] >= pd.Timestamp(start)
+    if end is not None:
+        mask &= df["timestamp"] < pd.Timestamp(end + timedelta(days=1))
+    return df[mask].reset_index(drop=True)
+
+
+def load_partitioned(filepath, start=None, end=None):
+    """Load rows with start <= timestamp date <= end, opening only the matching partitions"""
+    df = load_csvs(partition_files(filepath, start, end), Path(filepath).stem)
+    if df.empty:
+        return df
+    return filter_by_date(df, start, end)
+
+
+def remove_partitions(filepath):
+    """Delete the single-file log, every partition and their snapshots"""
+    if Path(filepath).exists():
+        Path(filepath).unlink()
+    remove_snapshot(filepath)
+    shutil.rmtree(partition_dir(filepath), ignore_errors=True)
+
+
+def split_legacy(filepath):
+    """Move rows of an unpartitioned log into monthly partitions. Returns rows moved.
+
+    The log is first renamed to <table>.csv.splitting; a split interrupted after
+    that resumes from the staged file, skipping the months it already moved.
+    """
+    filepath = Path(filepath)
+    staged = filepath.with_suffix(".csv.splitting")
+    progress = filepath.with_suffix(".csv.splitting.done")
+    with get_file_lock(filepath):
+        if not staged.exists():
+            if not filepath.exists():
+                return 0
+            os.replace(filepath, staged)
+    df = pd.read_csv(staged, dtype=str, keep_default_na=False)
+    done = set(progress.read_text().split()) if progress.exists() else set()
+    by_month = {}
+    for record in df.to_dict("records"):
+        by_month.setdefault(_month_of(record.get("timestamp")) or "unpartitioned", []).append(record)
+    for month, records in by_month.items():
+        if month in done:
+            continue
+        append_partitioned(records, filepath)
+        with open(progress, "a", encoding="utf-8") as f:
+            f.write(month + "\n")
+    staged.unlink()
+    progress.unlink(missing_ok=True)
+    remove_snapshot(filepath)
+    return len(df)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="NuAnswers partitioned log tools")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    split = subparsers.add_parser("split", help="move single-file logs into monthly partitions")
+    split.add_argument("--data-dir", default="/data" if os.path.exists("/data") else ".")
+    args = parser.parse_args()
+
+    if args.command == "split":
+        for table in sorted(PARTITIONED_TABLES):
+            filepath = Path(args.data_dir) / f"{table}.csv"
+            print(f"{table}: {split_legacy(filepath)} rows moved to {partition_dir(filepath)}/")
+
+
+if __name__ == "__main__":
+    main()
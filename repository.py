@@ -0,0 +1,274 @@
+"""Shared data-access layer for the student app and the Admin page.
+
+Both pages read and write every table through get_repository(), which picks
+a backend from NUANSWERS_STORAGE:
+
+- "csv" (default): append-only CSV logs with monthly partitions and Parquet snapshots
+- "sqlite": the indexed SQLite database in sqlite_storage
+- "memory": process-local tables, the no-I/O baseline for benchmarks/bench_storage.py
+
+Reads are cached per (table, date range) and reused until the backend
+reports a new data version for that table. Only the current version of each
+table is kept, with at most READ_CACHE_RANGES date ranges (least recently
+used are evicted first).
+"""
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import pandas as pd
+
+import sqlite_storage
+from partitions import (
+    append_partitioned, filter_by_date, is_partitioned, load_partitioned, partition_files,
+    remove_partitions,
+)
+from schemas import SCHEMAS, apply_schema, empty_frame
+from snapshots import load_csv, remove_snapshot
+from storage import append_rows, get_account_index
+
+DATA_DIR = Path("/data" if os.path.exists("/data") else ".")
+
+REGISTRATION_TABLE = "registration_data"
+ACCOUNTS_TABLE = "accounts"
+FEEDBACK_TABLE = "feedback_data"
+TOPIC_TABLE = "topic_data"
+COMPLETION_TABLE = "completion_data"
+RESPONSE_TIMES_TABLE = "response_times"
+CONTENT_ACCESS_TABLE = "content_access"
+RESOLUTION_TIMES_TABLE = "resolution_times"
+
+READ_CACHE_RANGES = 8
+
+
+def _check_table(table):
+    if table not in SCHEMAS:
+        raise ValueError(f"Unknown table: {table}")
+
+
+class CsvBackend:
+    """Append-only CSV files under data_dir (the default backend)"""
+
+    def __init__(self, data_dir):
+        self.data_dir = Path(data_dir)
+        self.data_dir.mkdir(exist_ok=True)
+
+    def path(self, table):
+        return self.data_dir / f"{table}.csv"
+
+    def append(self, table, data):
+        path = self.path(table)
+        if is_partitioned(path):
+            # registration, response-time and content-access logs are sharded by month
+            append_partitioned(data, path)
+        else:
+            append_rows(data, path)
+
+    def read(self, table, start=None, end=None):
+        path = self.path(table)
+        if is_partitioned(path):
+            # Only the monthly partitions overlapping [start, end] are opened
+            return load_partitioned(path, start=start, end=end)
+        # Typed Parquet snapshot plus the CSV rows appended since it was taken
+        return filter_by_date(load_csv(path), start, end)
+
+    def clear(self, table):
+        path = self.path(table)
+        if is_partitioned(path):
+            remove_partitions(path)
+            return
+        if path.exists():
+            path.unlink()
+        remove_snapshot(path)
+
+    def version(self, table):
+        """Size, mtime and inode of every file holding table's rows"""
+        stamps = []
+        for path in partition_files(self.path(table)):
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            stamps.append((path.name, stat.st_ino, stat.st_size, stat.st_mtime_ns))
+        return tuple(stamps)
+
+    def find_account(self, student_id, student_email):
+        # O(1) lookup in the shared index; only rows appended since the last login are parsed
+        return get_account_index(self.path(ACCOUNTS_TABLE)).lookup(student_id, student_email)
+
+
+class SqliteBackend:
+    """Indexed SQLite database (NUANSWERS_STORAGE=sqlite)"""
+
+    def __init__(self, db_path):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(exist_ok=True)
+
+    def append(self, table, data):
+        sqlite_storage.insert_rows(table, data, self.db_path)
+
+    def read(self, table, start=None, end=None):
+        # Indexed range query instead of a full-table scan
+        return sqlite_storage.read_table(table, self.db_path, start=start, end=end)
+
+    def clear(self, table):
+        sqlite_storage.clear_table(table, self.db_path)
+
+    def version(self, table):
+        """Any commit touches the database or its WAL file, so their stats identify the data version"""
+        stamps = []
+        for path in (self.db_path, Path(f"{self.db_path}-wal")):
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            stamps.append((stat.st_size, stat.st_mtime_ns))
+        return tuple(stamps)
+
+    def find_account(self, student_id, student_email):
+        return sqlite_storage.find_account(student_id, student_email, self.db_path)
+
+
+class MemoryBackend:
+    """Process-local tables (the no-I/O baseline of bench_storage.py --backend memory)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rows = {table: [] for table in SCHEMAS}
+        self._versions = {table: 0 for table in SCHEMAS}
+
+    def append(self, table, data):
+        records = [dict(record) for record in (data if isinstance(data, list) else
+                                               [data] if isinstance(data, dict) else data.to_dict("records"))]
+        with self._lock:
+            self._rows[table].extend(records)
+            self._versions[table] += 1
+
+    def read(self, table, start=None, end=None):
+        with self._lock:
+            rows = list(self._rows[table])
+        if not rows:
+            return empty_frame(table)
+        return filter_by_date(apply_schema(pd.DataFrame(rows), table), start, end)
+
+    def clear(self, table):
+        with self._lock:
+            self._rows[table] = []
+            self._versions[table] += 1
+
+    def version(self, table):
+        with self._lock:
+            return self._versions[table]
+
+    def find_account(self, student_id, student_email):
+        key = (str(student_id).strip(), (student_email or "").strip().lower())
+        with self._lock:
+            for account in self._rows[ACCOUNTS_TABLE]:
+                if (str(account.get("student_id")).strip(),
+                        str(account.get("student_email") or "").strip().lower()) == key:
+                    return dict(account)
+        return None
+
+
+class Repository:
+    """Typed reads and writes for every NuAnswers table on top of a pluggable backend"""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self._cache = {}
+        self._cache_lock = threading.Lock()
+
+    # Generic access
+
+    def read(self, table, start=None, end=None):
+        """Return table's rows (optionally within a date range), cached until the data changes"""
+        _check_table(table)
+        key = (start, end)
+        version = self.backend.version(table)
+        with self._cache_lock:
+            cached_version, ranges = self._cache.get(table, (None, None))
+            df = ranges.get(key) if cached_version == version else None
+            if df is not None:
+                ranges.move_to_end(key)
+        if df is None:
+            df = self.backend.read(table, start=start, end=end)
+            with self._cache_lock:
+                cached_version, ranges = self._cache.get(table, (None, None))
+                if cached_version != version:
+                    # Frames of an older version are never valid again
+                    ranges = OrderedDict()
+                    self._cache[table] = (version, ranges)
+                ranges[key] = df
+                ranges.move_to_end(key)
+                while len(ranges) > READ_CACHE_RANGES:
+                    ranges.popitem(last=False)
+        # Callers add helper columns; a shallow copy keeps those out of the cache
+        return df.copy(deep=False)
+
+    def append_rows(self, data, table):
+        """Append a dict, list of dicts or DataFrame to table"""
+        _check_table(table)
+        self.backend.append(table, data)
+
+    def clear(self, table):
+        """Delete every row of table"""
+        _check_table(table)
+        self.backend.clear(table)
+        with self._cache_lock:
+            self._cache.pop(table, None)
+
+    def find_account(self, student_id, student_email):
+        """Find an account by student_id and case-insensitive email. Returns a dict or None."""
+        return self.backend.find_account(student_id, student_email)
+
+    # Typed reads
+
+    def registrations(self, start=None, end=None):
+        return self.read(REGISTRATION_TABLE, start, end)
+
+    def accounts(self):
+        return self.read(ACCOUNTS_TABLE)
+
+    def feedback(self, start=None, end=None):
+        return self.read(FEEDBACK_TABLE, start, end)
+
+    def topics(self, start=None, end=None):
+        return self.read(TOPIC_TABLE, start, end)
+
+    def completions(self, start=None, end=None):
+        return self.read(COMPLETION_TABLE, start, end)
+
+    def response_times(self, start=None, end=None):
+        return self.read(RESPONSE_TIMES_TABLE, start, end)
+
+    def content_access(self, start=None, end=None):
+        return self.read(CONTENT_ACCESS_TABLE, start, end)
+
+    def resolution_times(self, start=None, end=None):
+        return self.read(RESOLUTION_TIMES_TABLE, start, end)
+
+
+_repository = None
+_repository_lock = threading.Lock()
+
+
+def create_backend(kind=None, data_dir=DATA_DIR):
+    """Build the backend named by kind (defaults to NUANSWERS_STORAGE, then "csv")"""
+    kind = (kind or os.environ.get("NUANSWERS_STORAGE", "csv")).strip().lower()
+    if kind == "sqlite":
+        return SqliteBackend(Path(data_dir) / sqlite_storage.DB_FILENAME)
+    if kind == "memory":
+        return MemoryBackend()
+    if kind == "csv":
+        return CsvBackend(data_dir)
+    raise ValueError(f"Unknown storage backend: {kind}")
+
+
+def get_repository():
+    """Return the process-wide Repository (survives Streamlit reruns and is shared by both pages)"""
+    global _repository
+    with _repository_lock:
+        if _repository is None:
+            _repository = Repository(create_backend())
+        return _repository
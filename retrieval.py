@@ -0,0 +1,420 @@
+"""Local retrieval over uploaded document chunks.
+
+Each chat session keeps a BM25Index and a TfidfIndex with one entry per
+chunk of every uploaded document. Documents are indexed once, when their
+ingestion job finishes, and removed when they are deleted. For each chat
+message only the chunks most relevant to the latest student turns (both
+rankings fused), within a token budget, go into the prompt instead of every
+uploaded document. The BM25 index is positional, so it also answers the
+search box's boolean and phrase queries with every match offset.
+"""
+import heapq
+import itertools
+import math
+import os
+import re
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import Counter, OrderedDict, defaultdict
+
+import numpy as np
+from scipy import sparse
+
+CONTEXT_TOKEN_BUDGET = int(os.environ.get("NUANSWERS_CONTEXT_TOKENS", "6000"))
+CONTEXT_TOP_K = int(os.environ.get("NUANSWERS_CONTEXT_TOP_K", "8"))
+# Recent student messages that make up the retrieval query
+QUERY_TURNS = 3
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+# Reciprocal rank fusion constant (ranks beyond the first few count for little)
+FUSION_K = 60
+
+TERM_PATTERN = re.compile(r"[a-z0-9]+(?:[.,'][a-z0-9]+)*", re.IGNORECASE)
+STOPWORDS = frozenset(
+    "a an and are as at be but by can do does for from how i if in into is it its me my of on or our so "
+    "that the their them then there these this to was we what when where which who why will with you your".split()
+)
+# Search box: shortest term that also matches longer terms it prefixes, and how many such terms
+PREFIX_MIN_CHARS = 3
+PREFIX_MAX_TERMS = 50
+MATCH_CACHE_SIZE = 32
+QUERY_PATTERN = re.compile(r'"([^"]*)"?|(\S+)')
+
+
+def terms(text):
+    """Lower-cased index terms of text (numbers such as 1,250.00 stay one term)"""
+    return [term for term in TERM_PATTERN.findall(text.lower()) if term not in STOPWORDS]
+
+
+def occurrences(text):
+    """Yield (term, position, character offset) for the index terms of text.
+
+    Positions count every word, stopwords included, so phrases such as
+    "cost of goods sold" still match on the positions of their other words.
+    """
+    for position, match in enumerate(TERM_PATTERN.finditer(text)):
+        term = match.group().lower()
+        if term not in STOPWORDS:
+            yield term, position, match.start()
+
+
+def parse_query(query):
+    """Split a search box query into OR-ed clauses of AND-ed items.
+
+    Words are AND-ed, "OR" (or "|") separates alternatives and double
+    quotes make a phrase. Each item is (phrase, [(relative position, term)]);
+    unquoted words that split into several terms (e.g. "debit/credit") are
+    phrases too.
+    """
+    clauses, items = [], []
+    for match in QUERY_PATTERN.finditer(query):
+        quoted, word = match.groups()
+        if word in ("OR", "|"):
+            if items:
+                clauses.append(items)
+            items = []
+            continue
+        words = [(position, term) for term, position, _ in occurrences(quoted if word is None else word)]
+        if words:
+            items.append((word is None or len(words) > 1, words))
+    if items:
+        clauses.append(items)
+    return clauses
+
+
+class BM25Index:
+    """Positional inverted index over the chunks of a session's uploaded documents.
+
+    Serves BM25 top-k chunk retrieval for the chat context and boolean,
+    phrase and prefix document search (with every match offset) for the
+    search box. Term positions and offsets are recorded once, at ingestion.
+    """
+
+    def __init__(self, k1=BM25_K1, b=BM25_B):
+        self.k1 = k1
+        self.b = b
+        self._ids = itertools.count()
+        # term -> {chunk id: array of (position, character offset) pairs, flattened}
+        self._postings = defaultdict(dict)
+        # chunk id -> (document key, document name, chunk, length in terms, offset of the chunk in the document text)
+        self._chunks = {}
+        # chunk id -> the terms it was posted under, so removal drops exactly those postings
+        self._chunk_terms = {}
+        self._documents = {}  # document key -> [chunk ids]
+        self._total_length = 0
+        self._sorted_terms = None
+        # Streamlit reruns the page with the same search box text on every interaction
+        self._match_cache = OrderedDict()
+
+    def __len__(self):
+        return len(self._chunks)
+
+    def __contains__(self, key):
+        return key in self._documents
+
+    def add_document(self, key, name, chunks):
+        """Index a document's chunks under key (the upload's file_id)"""
+        if key in self._documents:
+            self.remove_document(key)
+        chunk_ids = []
+        base = 0
+        for chunk in chunks:
+            chunk_id = next(self._ids)
+            length = 0
+            chunk_terms = []
+            for term, position, offset in occurrences(chunk["text"]):
+                postings = self._postings[term].get(chunk_id)
+                if postings is None:
+                    postings = self._postings[term][chunk_id] = array("I")
+                    chunk_terms.append(term)
+                postings.append(position)
+                postings.append(offset)
+                length += 1
+            self._chunks[chunk_id] = (key, name, chunk, length, base)
+            self._chunk_terms[chunk_id] = chunk_terms
+            self._total_length += length
+            # documents.document_text joins chunks with a newline
+            base += len(chunk["text"]) + 1
+            chunk_ids.append(chunk_id)
+        self._documents[key] = chunk_ids
+        self._sorted_terms = None
+        self._match_cache.clear()
+
+    def remove_document(self, key):
+        for chunk_id in self._documents.pop(key, []):
+            self._total_length -= self._chunks.pop(chunk_id)[3]
+            for term in self._chunk_terms.pop(chunk_id):
+                postings = self._postings[term]
+                del postings[chunk_id]
+                if not postings:
+                    del self._postings[term]
+        self._sorted_terms = None
+        self._match_cache.clear()
+
+    def _scores(self, query_terms, chunk_ids=None):
+        """BM25 score per chunk for query_terms, optionally only over chunk_ids"""
+        count = len(self._chunks)
+        average_length = (self._total_length / count if count else 0.0) or 1.0
+        scores = defaultdict(float)
+        for term in query_terms:
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for chunk_id, positions in postings.items():
+                if chunk_ids is not None and chunk_id not in chunk_ids:
+                    continue
+                frequency = len(positions) // 2
+                length = self._chunks[chunk_id][3]
+                norm = self.k1 * (1 - self.b + self.b * length / average_length)
+                scores[chunk_id] += idf * frequency * (self.k1 + 1) / (frequency + norm)
+        return scores
+
+    def search(self, query, k=CONTEXT_TOP_K):
+        """Top k chunks for query as [{"name", "chunk", "score"}], best first"""
+        if not self._chunks:
+            return []
+        start = time.perf_counter()
+        scores = self._scores(set(terms(query)))
+        best = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+        _stats.record("bm25", time.perf_counter() - start)
+        return [{"name": self._chunks[chunk_id][1], "chunk": self._chunks[chunk_id][2], "score": score}
+                for chunk_id, score in best]
+
+    def leading_chunks(self):
+        """The first chunk of every document, in upload order, as search-style hits"""
+        hits = []
+        for chunk_ids in self._documents.values():
+            if chunk_ids:
+                _, name, chunk = self._chunks[chunk_ids[0]][:3]
+                hits.append({"name": name, "chunk": chunk, "score": 0.0})
+        return hits
+
+    def _expand(self, term):
+        """The term itself plus the indexed terms it is a prefix of (for search-as-you-type)"""
+        if len(term) < PREFIX_MIN_CHARS:
+            return [term]
+        if self._sorted_terms is None:
+            self._sorted_terms = sorted(self._postings)
+        expanded = []
+        for candidate in itertools.islice(self._sorted_terms, bisect_left(self._sorted_terms, term), None):
+            if not candidate.startswith(term) or len(expanded) >= PREFIX_MAX_TERMS:
+                break
+            expanded.append(candidate)
+        return expanded or [term]
+
+    def _match_item(self, phrase, words):
+        """{chunk id: [(start, end) offsets in the chunk]} for one query item"""
+        if not phrase:
+            matches = defaultdict(list)
+            for term in self._expand(words[0][1]):
+                for chunk_id, positions in self._postings.get(term, {}).items():
+                    matches[chunk_id].extend((offset, offset + len(term)) for offset in positions[1::2])
+            return matches
+        postings = [self._postings.get(term, {}) for _, term in words]
+        chunk_ids = set(postings[0]).intersection(*postings[1:])
+        first_position, last_term = words[0][0], words[-1][1]
+        matches = {}
+        for chunk_id in chunk_ids:
+            positions = [dict(zip(postings[i][chunk_id][::2], postings[i][chunk_id][1::2])) for i in range(len(words))]
+            found = []
+            for position, offset in positions[0].items():
+                ends = [positions[i].get(position + words[i][0] - first_position) for i in range(1, len(words))]
+                if all(end is not None for end in ends):
+                    found.append((offset, (ends[-1] if ends else offset) + len(last_term)))
+            if found:
+                matches[chunk_id] = found
+        return matches
+
+    def match_documents(self, query):
+        """Documents matching a search box query, best first.
+
+        Returns [{"key", "name", "score", "offsets"}] where offsets are the
+        sorted (start, end) character ranges of every match in the
+        document's text (documents.document_text) and score is the BM25
+        score of the matched terms.
+        """
+        start = time.perf_counter()
+        cached = self._match_cache.get(query)
+        if cached is not None:
+            self._match_cache.move_to_end(query)
+            _stats.record("search", time.perf_counter() - start)
+            return cached
+        offsets = defaultdict(set)
+        query_terms = set()
+        for clause in parse_query(query):
+            item_matches = [self._match_item(phrase, words) for phrase, words in clause]
+            documents = None
+            for matches in item_matches:
+                keys = {self._chunks[chunk_id][0] for chunk_id in matches}
+                documents = keys if documents is None else documents & keys
+            if not documents:
+                continue
+            for (phrase, words), matches in zip(clause, item_matches):
+                query_terms.update([term for _, term in words] if phrase else self._expand(words[0][1]))
+                for chunk_id, found in matches.items():
+                    if self._chunks[chunk_id][0] in documents:
+                        offsets[chunk_id].update(found)
+        scores = self._scores(query_terms, offsets)
+        results = {}
+        for chunk_id, found in offsets.items():
+            key, name, _, _, base = self._chunks[chunk_id]
+            result = results.setdefault(key, {"key": key, "name": name, "score": 0.0, "offsets": []})
+            result["score"] += scores.get(chunk_id, 0.0)
+            result["offsets"].extend((base + begin, base + end) for begin, end in found)
+        for result in results.values():
+            result["offsets"].sort()
+        results = sorted(results.values(), key=lambda result: -result["score"])
+        self._match_cache[query] = results
+        if len(self._match_cache) > MATCH_CACHE_SIZE:
+            self._match_cache.popitem(last=False)
+        _stats.record("search", time.perf_counter() - start)
+        return results
+
+
+class TfidfIndex:
+    """TF-IDF vectors of a session's chunks in a SciPy sparse matrix, ranked by cosine similarity.
+
+    Term counts are computed once per document; adding or removing a
+    document only marks the matrix stale, and the next query restacks the
+    per-document blocks and reweights them with the current IDF. A query is
+    then a single sparse matrix-vector product.
+    """
+
+    def __init__(self):
+        self._vocabulary = {}  # term -> column
+        self._documents = {}  # document key -> (document name, chunks, term-count matrix)
+        self._matrix = None  # L2-normalized TF-IDF rows of every chunk, None when stale
+        self._rows = []  # (document key, document name, chunk) per matrix row
+        self._idf = None
+
+    def __len__(self):
+        return sum(len(chunks) for _, chunks, _ in self._documents.values())
+
+    def __contains__(self, key):
+        return key in self._documents
+
+    def add_document(self, key, name, chunks):
+        rows, columns, counts = [], [], []
+        for row, chunk in enumerate(chunks):
+            for term, count in Counter(terms(chunk["text"])).items():
+                rows.append(row)
+                columns.append(self._vocabulary.setdefault(term, len(self._vocabulary)))
+                counts.append(count)
+        matrix = sparse.csr_matrix((np.array(counts, dtype=np.float32), (rows, columns)),
+                                   shape=(len(chunks), len(self._vocabulary)))
+        self._documents[key] = (name, chunks, matrix)
+        self._matrix = None
+
+    def remove_document(self, key):
+        if self._documents.pop(key, None) is not None:
+            self._matrix = None
+
+    def _build(self):
+        width = len(self._vocabulary)
+        blocks, self._rows = [], []
+        for key, (name, chunks, counts) in self._documents.items():
+            if counts.shape[1] < width:
+                counts.resize((counts.shape[0], width))
+            blocks.append(counts)
+            self._rows.extend((key, name, chunk) for chunk in chunks)
+        counts = sparse.vstack(blocks, format="csr")
+        document_frequency = np.bincount(counts.indices, minlength=width)
+        self._idf = (np.log((1 + counts.shape[0]) / (1 + document_frequency)) + 1).astype(np.float32)
+        weights = counts.copy()
+        weights.data = 1 + np.log(weights.data)  # sublinear term frequency
+        weights = weights @ sparse.diags(self._idf)
+        norms = np.sqrt(np.asarray(weights.multiply(weights).sum(axis=1)).ravel())
+        norms[norms == 0] = 1.0
+        self._matrix = sparse.diags(1 / norms) @ weights
+
+    def scores(self, query):
+        """Cosine similarity of every chunk to query (aligned with self._rows), or None"""
+        if not self._documents:
+            return None
+        if self._matrix is None:
+            self._build()
+        counts = Counter(term for term in terms(query) if term in self._vocabulary)
+        if not counts:
+            return None
+        columns = np.fromiter((self._vocabulary[term] for term in counts), dtype=np.int64, count=len(counts))
+        vector = np.zeros(self._matrix.shape[1], dtype=np.float32)
+        vector[columns] = (1 + np.log(np.fromiter(counts.values(), dtype=np.float32))) * self._idf[columns]
+        return self._matrix @ (vector / np.linalg.norm(vector))
+
+    def search(self, query, k=CONTEXT_TOP_K):
+        """Top k chunks for query as [{"name", "chunk", "score"}], best first"""
+        start = time.perf_counter()
+        scores = self.scores(query)
+        if scores is None:
+            return []
+        k = min(k, len(scores))
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best])]
+        _stats.record("tfidf", time.perf_counter() - start)
+        return [{"name": self._rows[row][1], "chunk": self._rows[row][2], "score": float(scores[row])}
+                for row in best if scores[row] > 0]
+
+
+class RetrievalStats:
+    """Query counts and latency per index type (shared by every session in the process)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.queries = Counter()
+        self.seconds = Counter()
+
+    def record(self, kind, seconds):
+        with self._lock:
+            self.queries[kind] += 1
+            self.seconds[kind] += seconds
+
+    def stats(self):
+        with self._lock:
+            return {kind: {"queries": self.queries[kind],
+                           "avg_ms": self.seconds[kind] * 1000 / self.queries[kind] if self.queries[kind] else 0.0}
+                    for kind in ("bm25", "tfidf", "search")}
+
+
+_stats = RetrievalStats()
+
+
+def retrieval_stats():
+    return _stats.stats()
+
+
+def fuse(rankings, k=CONTEXT_TOP_K):
+    """Merge several best-first hit lists by reciprocal rank fusion"""
+    scores, hits = defaultdict(float), {}
+    for ranking in rankings:
+        for rank, hit in enumerate(ranking):
+            # Every index holds the documents' own chunk dicts, so identity matches them up
+            scores[id(hit["chunk"])] += 1 / (FUSION_K + rank + 1)
+            hits.setdefault(id(hit["chunk"]), hit)
+    best = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+    return [{**hits[chunk_id], "score": score} for chunk_id, score in best]
+
+
+def retrieval_query(messages, turns=QUERY_TURNS):
+    """Query text from the latest student messages"""
+    return "\n".join([m["content"] for m in messages if m["role"] == "user"][-turns:])
+
+
+def select_context(indexes, query, token_budget=CONTEXT_TOKEN_BUDGET, k=CONTEXT_TOP_K):
+    """Best chunks for query across indexes (rankings fused) that fit in token_budget.
+
+    When nothing matches (e.g. "can you help me with my homework?"), the
+    opening chunk of each document is used so the tutor still knows what
+    was uploaded.
+    """
+    hits = fuse([index.search(query, k) for index in indexes], k) or indexes[0].leading_chunks()
+    selected, used = [], 0
+    for hit in hits:
+        if used + hit["chunk"]["tokens"] > token_budget:
+            continue
+        selected.append(hit)
+        used += hit["chunk"]["tokens"]
+    return selected
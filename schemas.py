@@ -0,0 +1,171 @@
+"""Column schemas for every NuAnswers data table.
+
+Each table maps its columns, in file order, to a dtype spec:
+
+- "timestamp": parsed once with TIMESTAMP_FORMAT
+- "string", "float64", "Int64", "boolean": the matching pandas dtype
+- "category": categorical with levels taken from the data
+- a list: categorical with these known levels first (unexpected values are kept as extra levels)
+"""
+import re
+from pathlib import Path
+
+import pandas as pd
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Known levels, matching the options offered by the registration form
+GRADES = ["Freshman", "Sophomore", "Junior", "Senior", "Graduate"]
+CAMPUSES = ["Florham", "Metro", "Vancouver"]
+MAJORS = ["Accounting", "Finance", "MIS [Management Information Systems]"]
+CONTENT_TYPES = ["document", "image"]
+
+SCHEMAS = {
+    "registration_data": {
+        "timestamp": "timestamp",
+        "full_name": "string",
+        "student_id": "string",
+        "student_email": "string",
+        "grade": GRADES,
+        "campus": CAMPUSES,
+        "major": MAJORS,
+        "course_name": "category",
+        "course_id": "category",
+        "professor": "category",
+        "professor_email": "category",
+        "usage_time_minutes": "float64",
+    },
+    "accounts": {
+        "full_name": "string",
+        "student_id": "string",
+        "student_email": "string",
+        "grade": GRADES,
+        "campus": CAMPUSES,
+        "major": MAJORS,
+    },
+    "feedback_data": {
+        "timestamp": "timestamp",
+        "course_id": "category",
+        "rating": "Int64",
+        "topic": "string",
+        "difficulty": "Int64",
+    },
+    "topic_data": {
+        "timestamp": "timestamp",
+        "course_id": "category",
+        "topic": "string",
+        "difficulty": "Int64",
+    },
+    "completion_data": {
+        "timestamp": "timestamp",
+        "course_id": "category",
+        "completed": "boolean",
+    },
+    "response_times": {
+        "timestamp": "timestamp",
+        "response_time": "float64",
+        "user_id": "string",
+    },
+    "content_access": {
+        "timestamp": "timestamp",
+        "content_id": "string",
+        "content_type": CONTENT_TYPES,
+        "user_id": "string",
+    },
+    "resolution_times": {
+        "timestamp": "timestamp",
+        "resolution_time": "float64",
+        "topic": "string",
+        "user_id": "string",
+    },
+}
+
+_MONTH_RE = re.compile(r"^\d{4}-\d{2}$")
+_TRUE_VALUES = {"true", "1", "yes"}
+_FALSE_VALUES = {"false", "0", "no"}
+
+
+def table_name(filepath):
+    """Return the table a CSV path belongs to (monthly partitions use their directory name)"""
+    path = Path(filepath)
+    if _MONTH_RE.match(path.stem) and path.parent.name in SCHEMAS:
+        return path.parent.name
+    return path.stem
+
+
+def columns(table):
+    """Ordered column names of table"""
+    return list(SCHEMAS[table])
+
+
+def _to_boolean(series):
+    if pd.api.types.is_bool_dtype(series):
+        return series.astype("boolean")
+    lowered = series.astype("string").str.strip().str.lower()
+    result = pd.Series(pd.NA, index=series.index, dtype="boolean")
+    result[lowered.isin(_TRUE_VALUES)] = True
+    result[lowered.isin(_FALSE_VALUES)] = False
+    return result
+
+
+def _to_categorical(series, levels=None):
+    if not isinstance(series.dtype, pd.CategoricalDtype):
+        series = series.astype("category")
+    present = list(series.cat.categories)
+    if not all(isinstance(level, str) for level in present):
+        series = series.cat.rename_categories([str(level) for level in present])
+        present = list(series.cat.categories)
+    known = list(levels or [])
+    if present[:len(known)] == known:
+        return series
+    extra = sorted(set(present) - set(known))
+    return series.cat.set_categories(known + extra)
+
+
+def apply_schema(df, table):
+    """Cast the columns of df in place to the dtypes declared for table and return it"""
+    schema = SCHEMAS.get(table)
+    if schema is None:
+        return df
+    for column, spec in schema.items():
+        if column not in df.columns:
+            continue
+        series = df[column]
+        if spec == "timestamp":
+            if not pd.api.types.is_datetime64_any_dtype(series):
+                df[column] = pd.to_datetime(series, format=TIMESTAMP_FORMAT, errors="coerce")
+        elif isinstance(spec, list):
+            df[column] = _to_categorical(series, spec)
+        elif spec == "category":
+            df[column] = _to_categorical(series)
+        elif spec == "string":
+            df[column] = series.astype("string")
+        elif spec == "boolean":
+            df[column] = _to_boolean(series)
+        elif spec == "Int64":
+            df[column] = pd.to_numeric(series, errors="coerce").round().astype("Int64")
+        else:
+            df[column] = pd.to_numeric(series, errors="coerce").astype(spec)
+    return df
+
+
+def read_csv_typed(source, table, names=None):
+    """pd.read_csv with table's dtypes applied"""
+    schema = SCHEMAS.get(table, {})
+    # Text columns are never type-inferred; categoricals are built directly by the parser
+    text_dtypes = {}
+    for column, spec in schema.items():
+        if spec == "category" or isinstance(spec, list):
+            text_dtypes[column] = "category"
+        elif spec in ("string", "timestamp"):
+            text_dtypes[column] = "string"
+    if names is None:
+        df = pd.read_csv(source, dtype=text_dtypes)
+    else:
+        df = pd.read_csv(source, header=None, names=names, dtype=text_dtypes)
+    return apply_schema(df, table)
+
+
+def empty_frame(table):
+    """An empty DataFrame with table's columns and dtypes"""
+    return apply_schema(pd.DataFrame({column: pd.Series(dtype="object") for column in columns(table)}), table)
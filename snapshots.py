@@ -0,0 +1,223 @@
+"""Columnar (Parquet) snapshots of the append-only CSV logs.
+
+A snapshot holds every row of a CSV up to a byte offset, already cast to
+the table's schema. Readers load the snapshot and parse only the CSV tail
+written after it. A snapshot is taken the first time a log is read and
+refreshed once the tail grows past TAIL_COMPACT_ROWS, or explicitly with:
+
+    python snapshots.py compact [--data-dir /data]
+"""
+import argparse
+import io
+import json
+import logging
+import os
+import tempfile
+from pathlib import Path
+
+import pandas as pd
+
+from schemas import apply_schema, read_csv_typed, table_name
+from storage import get_file_lock, read_header
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_DIRNAME = "snapshots"
+TAIL_COMPACT_ROWS = 5000
+
+
+# Schema metadata key holding what the snapshot covers, so data and offset are replaced in one rename
+META_KEY = b"nuanswers"
+
+
+def _snapshot_path(csv_path):
+    return Path(csv_path).parent / SNAPSHOT_DIRNAME / f"{Path(csv_path).stem}.parquet"
+
+
+def _legacy_meta_path(csv_path):
+    """Sidecar JSON written by older versions, before the metadata moved into the Parquet file"""
+    return _snapshot_path(csv_path).with_suffix(".json")
+
+
+def _read_meta(parquet_file):
+    """Return the covered inode/offset/rows/columns stored in a snapshot, or None"""
+    raw = (parquet_file.schema_arrow.metadata or {}).get(META_KEY)
+    try:
+        return json.loads(raw) if raw else None
+    except ValueError:
+        return None
+
+
+def _open_snapshot(csv_path):
+    """Open the current snapshot of csv_path as a ParquetFile, or None"""
+    try:
+        return pq.ParquetFile(_snapshot_path(csv_path))
+    except FileNotFoundError:
+        return None
+    except Exception:
+        logger.warning("Ignoring unreadable snapshot of %s", csv_path, exc_info=True)
+        return None
+
+
+def write_snapshot(csv_path, df, offset, inode):
+    """Persist df as the snapshot of csv_path covering its first offset bytes"""
+    parquet_path = _snapshot_path(csv_path)
+    parquet_path.parent.mkdir(exist_ok=True)
+    meta = {"inode": inode, "offset": offset, "rows": len(df), "columns": list(df.columns)}
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}), META_KEY: json.dumps(meta).encode()})
+    with get_file_lock(parquet_path):
+        # A concurrent compaction may already have stored a snapshot covering more of the file
+        current = _open_snapshot(csv_path)
+        current_meta = None
+        if current is not None:
+            with current:
+                current_meta = _read_meta(current)
+        if current_meta and current_meta["inode"] == inode and current_meta["offset"] >= offset:
+            return
+        fd, tmp_path = tempfile.mkstemp(dir=parquet_path.parent, prefix=f".{parquet_path.stem}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pq.write_table(table, f)
+            os.replace(tmp_path, parquet_path)
+        except BaseException:
+            Path(tmp_path).unlink(missing_ok=True)
+            raise
+        _legacy_meta_path(csv_path).unlink(missing_ok=True)
+
+
+def remove_snapshot(csv_path):
+    """Delete the snapshot for csv_path (used when the log itself is cleared)"""
+    parquet_path = _snapshot_path(csv_path)
+    with get_file_lock(parquet_path):
+        parquet_path.unlink(missing_ok=True)
+        _legacy_meta_path(csv_path).unlink(missing_ok=True)
+
+
+def _load_parts(csv_path, compact_threshold):
+    """Return (snapshot Arrow table or None, DataFrame of the rows it does not cover or None) for csv_path.
+
+    When there was no usable snapshot, or the tail has at least compact_threshold
+    rows, the combined rows become the new snapshot and are returned as the frame.
+    """
+    table = table_name(csv_path)
+    with get_file_lock(csv_path):
+        # Only read up to the size seen now; rows appended later belong to the next tail
+        header = read_header(csv_path)
+        with open(csv_path, "rb") as f:
+            stat = os.fstat(f.fileno())
+            # The open ParquetFile keeps reading this snapshot even if a compaction replaces it
+            snapshot = _open_snapshot(csv_path) if HAS_PYARROW else None
+            meta = _read_meta(snapshot) if snapshot is not None else None
+            usable = (
+                meta is not None
+                and meta["inode"] == stat.st_ino
+                and meta["offset"] <= stat.st_size
+                and meta["columns"] == header
+                and meta["rows"] == snapshot.metadata.num_rows
+            )
+            start = meta["offset"] if usable else 0
+            f.seek(start)
+            tail_bytes = f.read(stat.st_size - start)
+    # A partial last row (crash mid-append) is cut off by the next append, so never cover it
+    if not tail_bytes.endswith(b"\n"):
+        tail_bytes = tail_bytes[:tail_bytes.rfind(b"\n") + 1]
+    covered = start + len(tail_bytes)
+
+    if usable:
+        with snapshot:
+            snapshot_table = snapshot.read()
+        if not tail_bytes.strip():
+            return snapshot_table, None
+        tail = read_csv_typed(io.BytesIO(tail_bytes), table, names=header)
+        if compact_threshold is None or len(tail) < compact_threshold:
+            return snapshot_table, tail
+        # Re-apply the schema so categoricals with different levels stay categorical
+        df = apply_schema(pd.concat([snapshot_table.to_pandas(), tail], ignore_index=True), table)
+    else:
+        if snapshot is not None:
+            snapshot.close()
+        df = read_csv_typed(io.BytesIO(tail_bytes), table) if tail_bytes.strip() else pd.DataFrame(columns=header)
+        if df.empty or compact_threshold is None:
+            return None, df
+
+    if HAS_PYARROW:
+        try:
+            write_snapshot(csv_path, df, covered, stat.st_ino)
+        except Exception:
+            logger.exception("Failed to write snapshot for %s", csv_path)
+    return None, df
+
+
+def load_csv(csv_path, compact_threshold=TAIL_COMPACT_ROWS):
+    """Load a CSV log as snapshot + un-compacted tail.
+
+    Falls back to a plain read when there is no usable snapshot. When there was
+    no snapshot, or the tail has at least compact_threshold rows, the combined
+    frame becomes the new snapshot (pass None to never compact).
+    """
+    csv_path = Path(csv_path)
+    if not csv_path.exists():
+        return pd.DataFrame()
+    snapshot_table, rest = _load_parts(csv_path, compact_threshold)
+    if snapshot_table is None:
+        return rest
+    df = snapshot_table.to_pandas()
+    if rest is None:
+        return df
+    return apply_schema(pd.concat([df, rest], ignore_index=True), table_name(csv_path))
+
+
+def load_csvs(csv_paths, table, compact_threshold=TAIL_COMPACT_ROWS):
+    """Load several logs of table (e.g. monthly partitions) as one frame, in file order.
+
+    Snapshots and tails are concatenated as Arrow tables and converted to
+    pandas once, instead of building and re-casting a frame per file.
+    """
+    parts = []
+    for csv_path in csv_paths:
+        if Path(csv_path).exists():
+            parts += [part for part in _load_parts(Path(csv_path), compact_threshold) if part is not None and len(part)]
+    if not parts:
+        return pd.DataFrame()
+    if len(parts) == 1 and isinstance(parts[0], pd.DataFrame):
+        return parts[0]
+    if HAS_PYARROW:
+        tables = [pa.Table.from_pandas(part, preserve_index=False) if isinstance(part, pd.DataFrame) else part
+                  for part in parts]
+        df = pa.concat_tables(tables, promote_options="permissive").to_pandas()
+    else:
+        df = pd.concat(parts, ignore_index=True)
+    return apply_schema(df, table)
+
+
+def compact(csv_path):
+    """Rewrite the snapshot of csv_path so that it covers the whole file. Returns row count."""
+    return len(load_csv(csv_path, compact_threshold=0))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="NuAnswers CSV snapshot tools")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    compact_parser = subparsers.add_parser("compact", help="snapshot every CSV log in the data directory")
+    compact_parser.add_argument("--data-dir", default="/data" if os.path.exists("/data") else ".")
+    args = parser.parse_args()
+
+    if not HAS_PYARROW:
+        parser.error("pyarrow is required to write snapshots")
+    if args.command == "compact":
+        data_dir = Path(args.data_dir)
+        # Top-level logs plus monthly partitions (<table>/<YYYY-MM>.csv)
+        for csv_path in sorted(data_dir.glob("*.csv")) + sorted(data_dir.glob("*/*.csv")):
+            print(f"{csv_path.relative_to(data_dir)}: {compact(csv_path)} rows snapshotted")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+"""Optional SQLite storage backend for the NuAnswers data tables.
+
+Enable it by setting NUANSWERS_STORAGE=sqlite. Existing CSV files can be
+imported once with:
+
+    python sqlite_storage.py migrate [--data-dir /data]
+"""
+import argparse
+import os
+import sqlite3
+import threading
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+import pandas as pd
+
+import partitions
+from schemas import SCHEMAS, apply_schema
+
+DB_FILENAME = "nuanswers.db"
+
+# SQL column types for the dtype specs in schemas.SCHEMAS (categoricals and timestamps are TEXT)
+SQL_TYPES = {"float64": "REAL", "Int64": "INTEGER"}
+
+# Table name -> ordered (column, SQL type) pairs. Table names match the CSV file stems.
+TABLES = {
+    table: [(column, SQL_TYPES.get(spec, "TEXT") if isinstance(spec, str) else "TEXT")
+            for column, spec in schema.items()]
+    for table, schema in SCHEMAS.items()
+}
+
+INDEXED_COLUMNS = ["timestamp", "student_id", "course_id", "major"]
+
+_local = threading.local()
+_initialized = set()
+_init_lock = threading.Lock()
+
+
+def get_connection(db_path):
+    """Return this thread's connection to db_path, creating the schema on first use"""
+    db_path = str(db_path)
+    connections = getattr(_local, "connections", None)
+    if connections is None:
+        connections = _local.connections = {}
+    conn = connections.get(db_path)
+    if conn is None:
+        conn = sqlite3.connect(db_path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        connections[db_path] = conn
+    if db_path not in _initialized:
+        with _init_lock:
+            if db_path not in _initialized:
+                init_schema(conn)
+                _initialized.add(db_path)
+    return conn
+
+
+def init_schema(conn):
+    """Create all tables and their indexes if they do not exist yet"""
+    with conn:
+        for table, columns in TABLES.items():
+            column_sql = ", ".join(f"{name} {sql_type}" for name, sql_type in columns)
+            conn.execute(f"CREATE TABLE IF NOT EXISTS {table} ({column_sql})")
+            names = [name for name, _ in columns]
+            for column in INDEXED_COLUMNS:
+                if column in names:
+                    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_{column} ON {table} ({column})")
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_accounts_login "
+            "ON accounts (student_id, student_email COLLATE NOCASE)"
+        )
+        conn.execute("CREATE TABLE IF NOT EXISTS migrations (source TEXT PRIMARY KEY, rows INTEGER, migrated_at TEXT)")
+
+
+def _check_table(table):
+    if table not in TABLES:
+        raise ValueError(f"Unknown table: {table}")
+    return [name for name, _ in TABLES[table]]
+
+
+def _to_sql_value(value):
+    """Convert pandas/NumPy scalars into values sqlite3 can bind"""
+    if value is None:
+        return None
+    try:
+        if pd.isna(value):
+            return None
+    except (TypeError, ValueError):
+        pass
+    if hasattr(value, "item"):
+        value = value.item()
+    if isinstance(value, bool):
+        return str(value)
+    return value
+
+
+def _execute_insert(conn, table, data):
+    """Run the INSERT for data on conn without committing"""
+    columns = _check_table(table)
+    if isinstance(data, dict):
+        records = [data]
+    elif isinstance(data, list):
+        records = data
+    else:
+        records = data.to_dict("records")
+    if not records:
+        return
+    placeholders = ", ".join("?" for _ in columns)
+    values = [tuple(_to_sql_value(record.get(column)) for column in columns) for record in records]
+    conn.executemany(f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})", values)
+
+
+def insert_rows(table, data, db_path):
+    """Insert a dict, list of dicts or DataFrame into table (unknown columns are ignored)"""
+    conn = get_connection(db_path)
+    with conn:
+        _execute_insert(conn, table, data)
+
+
+def _bound(value, end=False):
+    """Turn a date/datetime/string range bound into a comparable timestamp string"""
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m-%d %H:%M:%S")
+    if isinstance(value, date):
+        # Date bounds are inclusive, so the end bound is the start of the next day
+        return (value + timedelta(days=1) if end else value).strftime("%Y-%m-%d")
+    return str(value)
+
+
+def read_table(table, db_path, start=None, end=None):
+    """Read table into a DataFrame, optionally limited to a timestamp range using the index"""
+    columns = _check_table(table)
+    query = f"SELECT {', '.join(columns)} FROM {table}"
+    clauses, params = [], []
+    if start is not None:
+        clauses.append("timestamp >= ?")
+        params.append(_bound(start))
+    if end is not None:
+        is_day = isinstance(end, date) and not isinstance(end, datetime)
+        clauses.append("timestamp < ?" if is_day else "timestamp <= ?")
+        params.append(_bound(end, end=True))
+    if clauses:
+        query += " WHERE " + " AND ".join(clauses)
+    return apply_schema(pd.read_sql_query(query, get_connection(db_path), params=params), table)
+
+
+def find_account(student_id, student_email, db_path):
+    """Look up one account by student_id and case-insensitive email. Returns a dict or None."""
+    columns = _check_table("accounts")
+    row = get_connection(db_path).execute(
+        f"SELECT {', '.join(columns)} FROM accounts "
+        "WHERE student_id = ? AND student_email = ? COLLATE NOCASE LIMIT 1",
+        (str(student_id).strip(), (student_email or "").strip()),
+    ).fetchone()
+    if row is None:
+        return None
+    return dict(zip(columns, row))
+
+
+def clear_table(table, db_path):
+    """Delete every row from table"""
+    _check_table(table)
+    conn = get_connection(db_path)
+    with conn:
+        conn.execute(f"DELETE FROM {table}")
+
+
+def _table_csvs(data_dir, table):
+    """The CSV files holding rows of table: its log plus, for partitioned tables, every monthly file"""
+    csv_path = Path(data_dir) / f"{table}.csv"
+    if partitions.is_partitioned(csv_path):
+        return partitions.partition_files(csv_path)
+    return [csv_path] if csv_path.exists() else []
+
+
+def _migrate_csv(conn, table, csv_path):
+    """Import one CSV file into table unless it was imported before. Returns rows imported or None."""
+    source = str(csv_path.resolve())
+    if conn.execute("SELECT 1 FROM migrations WHERE source = ?", (source,)).fetchone():
+        return None
+    df = pd.read_csv(csv_path, dtype=str)
+    df = df.astype(object).where(df.notna(), None)
+    # The rows and the migrations marker commit together, so a failed import can be rerun
+    with conn:
+        _execute_insert(conn, table, df)
+        conn.execute(
+            "INSERT INTO migrations (source, rows, migrated_at) VALUES (?, ?, ?)",
+            (source, len(df), datetime.now().strftime("%Y-%m-%d %H:%M:%S")),
+        )
+    return len(df)
+
+
+def migrate_csvs(data_dir, db_path):
+    """Import every existing table CSV under data_dir once. Returns {table: rows imported}."""
+    conn = get_connection(db_path)
+    imported = {}
+    for table in TABLES:
+        for csv_path in _table_csvs(data_dir, table):
+            rows = _migrate_csv(conn, table, csv_path)
+            if rows is not None:
+                imported[table] = imported.get(table, 0) + rows
+    return imported
+
+
+def main():
+    parser = argparse.ArgumentParser(description="NuAnswers SQLite storage tools")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    migrate = subparsers.add_parser("migrate", help="import existing CSV files into SQLite")
+    migrate.add_argument("--data-dir", default="/data" if os.path.exists("/data") else ".")
+    args = parser.parse_args()
+
+    if args.command == "migrate":
+        db_path = Path(args.data_dir) / DB_FILENAME
+        imported = migrate_csvs(args.data_dir, db_path)
+        if not imported:
+            print("Nothing to migrate.")
+        for table, rows in imported.items():
+            print(f"{table}: {rows} rows imported into {db_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,435 @@
+import atexit
+import csv
+import io
+import logging
+import os
+import queue
+import threading
+import time
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# One lock per CSV file so concurrent Streamlit sessions never interleave rows
+_file_locks = {}
+_file_locks_guard = threading.Lock()
+
+
+def get_file_lock(filepath):
+    """Return the process-wide lock guarding writes to filepath"""
+    key = os.path.abspath(filepath)
+    with _file_locks_guard:
+        lock = _file_locks.get(key)
+        if lock is None:
+            lock = threading.Lock()
+            _file_locks[key] = lock
+        return lock
+
+
+def read_header(filepath):
+    """Read only the header row of a CSV file (empty list if missing or empty)"""
+    try:
+        with open(filepath, "r", newline="", encoding="utf-8") as f:
+            return next(csv.reader(f), [])
+    except FileNotFoundError:
+        return []
+
+
+def rows_to_records(data):
+    """Normalize a dict, list of dicts or DataFrame into a list of dicts"""
+    if isinstance(data, dict):
+        return [data]
+    if isinstance(data, list):
+        return data
+    return data.to_dict("records")
+
+
+def _field_order(header, records):
+    """Keep the existing column order and add any new columns at the end"""
+    fields = list(header)
+    seen = set(fields)
+    for record in records:
+        for key in record:
+            if key not in seen:
+                seen.add(key)
+                fields.append(key)
+    return fields
+
+
+def _fsync_dir(path):
+    """Persist a rename by syncing the containing directory (no-op where unsupported)"""
+    try:
+        fd = os.open(str(Path(path).parent), os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def _widen_file(filepath, fields, fsync=True):
+    """Rewrite an existing CSV with a wider header (only when new columns appear).
+
+    The new file is written and synced under a temporary name, then atomically
+    renamed over the old one, so a crash leaves either the old or the new file.
+    """
+    tmp_path = Path(f"{filepath}.tmp")
+    with open(filepath, "r", newline="", encoding="utf-8") as src, \
+            open(tmp_path, "w", newline="", encoding="utf-8") as dst:
+        reader = csv.DictReader(src)
+        writer = csv.DictWriter(dst, fieldnames=fields, restval="")
+        writer.writeheader()
+        for row in reader:
+            writer.writerow(row)
+        if fsync:
+            dst.flush()
+            os.fsync(dst.fileno())
+    os.replace(tmp_path, filepath)
+    if fsync:
+        _fsync_dir(filepath)
+
+
+def _truncate_torn_row(filepath, fsync=True):
+    """Cut a partial last row (left by a crash mid-append) back to the last complete line.
+
+    Must be called under the file's lock. Returns the number of bytes dropped.
+    """
+    try:
+        f = open(filepath, "rb+")
+    except FileNotFoundError:
+        return 0
+    with f:
+        size = f.seek(0, os.SEEK_END)
+        if size == 0:
+            return 0
+        f.seek(size - 1)
+        if f.read(1) == b"\n":
+            return 0
+        # Scan back in blocks for the newline ending the last complete row
+        end = size
+        keep = 0
+        while end > 0:
+            start = max(0, end - 64 * 1024)
+            f.seek(start)
+            newline = f.read(end - start).rfind(b"\n")
+            if newline != -1:
+                keep = start + newline + 1
+                break
+            end = start
+        f.truncate(keep)
+        if fsync:
+            f.flush()
+            os.fsync(f.fileno())
+    logger.warning("Dropped a %d-byte partial row at the end of %s", size - keep, filepath)
+    return size - keep
+
+
+def _append_records(records, filepath, fsync=True):
+    """Append records to filepath under its lock as a single write, optionally fsynced"""
+    with get_file_lock(filepath):
+        # A torn row from an earlier crash would otherwise be glued to the first new row
+        _truncate_torn_row(filepath, fsync=fsync)
+        header = read_header(filepath)
+        fields = _field_order(header, records)
+        if header and fields != header:
+            _widen_file(filepath, fields, fsync=fsync)
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=fields, restval="")
+        if not header:
+            writer.writeheader()
+        writer.writerows(records)
+        # One write call per batch keeps a crash from leaving interleaved partial rows
+        with open(filepath, "ab") as f:
+            f.write(buffer.getvalue().encode("utf-8"))
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        if fsync and not header:
+            _fsync_dir(filepath)
+
+
+class _CommitRequest:
+    __slots__ = ("filepath", "records", "wake", "leader", "error")
+
+    def __init__(self, filepath, records):
+        self.filepath = filepath
+        self.records = records
+        # Set once the records are committed, or when leadership is handed to this request
+        self.wake = threading.Event()
+        self.leader = False
+        self.error = None
+
+
+class GroupCommitWriter:
+    """Durable CSV appends where concurrent callers share one write and fsync per file.
+
+    Each file has at most one leader. The leader commits every request queued
+    for its file at that moment as one batch, then hands leadership to the
+    oldest request that arrived meanwhile and returns, so no caller commits
+    more than one batch and different files are committed independently.
+    """
+
+    def __init__(self, fsync=True):
+        self.fsync = fsync
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._leaders = set()
+        self.commits = 0
+        self.rows = 0
+
+    def append(self, data, filepath):
+        """Append rows to filepath and return once they are durably on disk"""
+        records = rows_to_records(data)
+        if not records:
+            return
+        request = _CommitRequest(Path(filepath), records)
+        with self._lock:
+            self._pending.setdefault(request.filepath, []).append(request)
+            if request.filepath not in self._leaders:
+                self._leaders.add(request.filepath)
+                request.leader = True
+        if not request.leader:
+            request.wake.wait()
+        if request.leader:
+            self._lead(request)
+        if request.error is not None:
+            raise request.error
+
+    def _lead(self, request):
+        """Commit the batch holding request, then pass leadership of its file on"""
+        filepath = request.filepath
+        with self._lock:
+            batch = self._pending.pop(filepath)
+        error = None
+        try:
+            _append_records([record for queued in batch for record in queued.records], filepath, fsync=self.fsync)
+        except Exception as e:
+            error = e
+        with self._lock:
+            self.commits += 1
+            self.rows += sum(len(queued.records) for queued in batch)
+            waiting = self._pending.get(filepath)
+            if waiting:
+                waiting[0].leader = True
+                waiting[0].wake.set()
+            else:
+                self._leaders.discard(filepath)
+        for queued in batch:
+            queued.error = error
+            queued.wake.set()
+
+    def stats(self):
+        """Return the number of group commits (fsyncs) and rows written"""
+        with self._lock:
+            return {"commits": self.commits, "rows": self.rows}
+
+
+_group_commit_writer = GroupCommitWriter()
+
+
+def append_rows(data, filepath):
+    """Append rows to a CSV file without reading or rewriting existing rows.
+
+    The header is written once when the file is created. Rows are written in
+    the existing column order; columns missing from a row are left empty.
+    Appends are durable and concurrent callers are group-committed.
+    """
+    _group_commit_writer.append(data, filepath)
+
+
+def group_commit_stats():
+    """Return the shared group-commit writer's counters"""
+    return _group_commit_writer.stats()
+
+
+def _account_key(student_id, student_email):
+    """Normalize the login key the same way find_account always has"""
+    return str(student_id).strip(), (student_email or "").strip().lower()
+
+
+class AccountIndex:
+    """Process-wide hash index over accounts.csv keyed on (student_id, lowercased email).
+
+    The index is built once and then kept current by reading only the bytes
+    appended since the last lookup. A file that shrinks or is replaced is
+    re-indexed from scratch.
+    """
+
+    def __init__(self, filepath):
+        self.filepath = Path(filepath)
+        self._lock = threading.Lock()
+        self._accounts = {}
+        self._header = []
+        self._inode = None
+        self._offset = 0
+
+    def _reset(self):
+        self._accounts = {}
+        self._header = []
+        self._inode = None
+        self._offset = 0
+
+    def _refresh(self):
+        try:
+            stat = os.stat(self.filepath)
+        except FileNotFoundError:
+            self._reset()
+            return
+        if stat.st_ino != self._inode or stat.st_size < self._offset:
+            self._reset()
+            self._inode = stat.st_ino
+        if stat.st_size == self._offset:
+            return
+        with open(self.filepath, "rb") as f:
+            f.seek(self._offset)
+            chunk = f.read(stat.st_size - self._offset)
+        # Only consume complete lines; a row still being written is picked up next time
+        end = chunk.rfind(b"\n") + 1
+        if end == 0:
+            return
+        reader = csv.reader(io.StringIO(chunk[:end].decode("utf-8"), newline=""))
+        if not self._header:
+            self._header = next(reader, [])
+        for row in reader:
+            if not row:
+                continue
+            account = dict(zip(self._header, row))
+            key = _account_key(account.get("student_id"), account.get("student_email"))
+            self._accounts.setdefault(key, account)
+        self._offset += end
+
+    def lookup(self, student_id, student_email):
+        """Return the first account matching student_id and email (case-insensitive), or None"""
+        with self._lock:
+            self._refresh()
+            account = self._accounts.get(_account_key(student_id, student_email))
+        return dict(account) if account is not None else None
+
+    def __len__(self):
+        with self._lock:
+            self._refresh()
+            return len(self._accounts)
+
+
+_account_indexes = {}
+
+
+def get_account_index(filepath):
+    """Return the shared AccountIndex for filepath (survives Streamlit reruns)"""
+    key = os.path.abspath(filepath)
+    with _file_locks_guard:
+        index = _account_indexes.get(key)
+        if index is None:
+            index = _account_indexes[key] = AccountIndex(filepath)
+        return index
+
+
+class WriteBehindQueue:
+    """Bounded queue of rows written to their target files by a background thread.
+
+    Rows are batched per target and flushed when batch_size rows are pending
+    or flush_interval seconds have passed. enqueue never blocks: when the queue
+    is full the row is dropped and counted. Pending rows are drained at exit.
+    """
+
+    def __init__(self, writer, maxsize=10000, batch_size=500, flush_interval=1.0):
+        self.writer = writer
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._stop = threading.Event()
+        self._counters_lock = threading.Lock()
+        self.enqueued = 0
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def enqueue(self, data, target):
+        """Queue one row (dict) or several rows (list/DataFrame) for target; returns False if dropped"""
+        records = rows_to_records(data)
+        accepted = True
+        for record in records:
+            try:
+                self._queue.put_nowait((target, record))
+            except queue.Full:
+                accepted = False
+                with self._counters_lock:
+                    self.dropped += 1
+                continue
+            with self._counters_lock:
+                self.enqueued += 1
+        return accepted
+
+    def stats(self):
+        """Return queue depth and row counters"""
+        with self._counters_lock:
+            return {
+                "queue_depth": self._queue.qsize(),
+                "enqueued": self.enqueued,
+                "written": self.written,
+                "dropped": self.dropped,
+                "failed": self.failed,
+            }
+
+    def _flush(self, batches):
+        for target, rows in batches.items():
+            try:
+                self.writer(rows, target)
+                with self._counters_lock:
+                    self.written += len(rows)
+            except Exception:
+                logger.exception("Failed to write %d queued rows to %s", len(rows), target)
+                with self._counters_lock:
+                    self.failed += len(rows)
+        batches.clear()
+
+    def _run(self):
+        batches = {}
+        pending = 0
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            timeout = max(0.0, deadline - time.monotonic())
+            try:
+                target, record = self._queue.get(timeout=timeout)
+                batches.setdefault(target, []).append(record)
+                pending += 1
+            except queue.Empty:
+                pass
+            stopping = self._stop.is_set() and self._queue.empty()
+            if pending >= self.batch_size or time.monotonic() >= deadline or stopping:
+                if batches:
+                    self._flush(batches)
+                pending = 0
+                deadline = time.monotonic() + self.flush_interval
+            if stopping:
+                return
+
+    def close(self, timeout=10.0):
+        """Stop the flusher thread after it has written every pending row"""
+        self._stop.set()
+        self._thread.join(timeout)
+
+
+_write_behind_queue = None
+
+
+def get_write_behind_queue(writer):
+    """Return the process-wide WriteBehindQueue, starting it with writer on first use"""
+    global _write_behind_queue
+    with _file_locks_guard:
+        if _write_behind_queue is None:
+            _write_behind_queue = WriteBehindQueue(writer)
+        return _write_behind_queue
+
+
+def write_behind_stats():
+    """Return the shared queue's counters (all zero if it has not been started)"""
+    if _write_behind_queue is None:
+        return {"queue_depth": 0, "enqueued": 0, "written": 0, "dropped": 0, "failed": 0}
+    return _write_behind_queue.stats()
@@ -0,0 +1,332 @@
+"""Cheap checks on an upload before it is queued for extraction.
+
+triage_upload runs in the Streamlit script thread, so it never hands the
+upload to a parser: it sniffs the file's magic bytes, checks the size, reads
+page, slide, sheet and row counts from the raw bytes and container metadata
+(PDF page objects, OOXML zip directory and sheet dimensions, image headers)
+and estimates how much text extraction would produce. Uploads that cannot
+yield text or would blow the worker's budgets (zip bombs, huge shared-string
+tables, encrypted Office files, mislabelled or binary files) are rejected up
+front; large but valid files are accepted with a note saying which part the
+extraction budgets will keep.
+
+check_document holds the checks that need a parser (PDF page tree, text
+layer and encryption, XLS workbook globals). The extraction worker runs it
+under its time and memory limits, and its rejection fails the job.
+"""
+import io
+import logging
+import os
+import re
+import threading
+import time
+import zipfile
+from collections import Counter
+from pathlib import Path
+
+import PyPDF2
+import xlrd
+
+from extraction import MAX_EXTRACTED_CHARS, PDF_MAX_PAGES, SHEET_MAX_ROWS
+
+try:
+    from PIL import Image
+    HAS_PIL = True
+except ImportError:
+    HAS_PIL = False
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_MAX_BYTES = int(os.environ.get("NUANSWERS_UPLOAD_MAX_BYTES", str(50 * 1024 * 1024)))
+ZIP_MAX_UNCOMPRESSED = int(os.environ.get("NUANSWERS_ZIP_MAX_UNCOMPRESSED", str(256 * 1024 * 1024)))
+ZIP_MAX_RATIO = 100
+ZIP_MAX_ENTRIES = 10000
+# openpyxl loads the whole shared-string table even in read-only mode
+XLSX_MAX_SHARED_STRINGS = 64 * 1024 * 1024
+IMAGE_MAX_PIXELS = int(os.environ.get("NUANSWERS_IMAGE_MAX_PIXELS", "50000000"))
+# Pages inspected for a text layer before a PDF is considered scanned
+PDF_SAMPLE_PAGES = 5
+PDF_CHARS_PER_PAGE = 3000
+
+OLE2_MAGIC = b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1"
+# Password-protected Office files are OLE2 containers holding an "EncryptedPackage" stream
+ENCRYPTED_PACKAGE = "EncryptedPackage".encode("utf-16-le")
+# "/Type /Page" opens every page object ("/Type /Pages" is the tree above them)
+PDF_PAGE_OBJECT = re.compile(rb"/Type\s*/Page(?![A-Za-z])")
+OOXML_PARTS = {".docx": "word/document.xml", ".pptx": "ppt/presentation.xml", ".xlsx": "xl/workbook.xml"}
+
+
+class UploadRejected(ValueError):
+    """An upload that failed triage; the message says why"""
+
+
+def sniff_format(data):
+    """Container format from magic bytes: pdf, zip, ole2, png, jpeg, gif, text or binary"""
+    head = data[:1024]
+    if b"%PDF-" in head:
+        return "pdf"
+    if head.startswith(b"PK\x03\x04"):
+        return "zip"
+    if head.startswith(OLE2_MAGIC):
+        return "ole2"
+    if head.startswith(b"\x89PNG"):
+        return "png"
+    if head.startswith(b"\xff\xd8\xff"):
+        return "jpeg"
+    if head.startswith((b"GIF87a", b"GIF89a")):
+        return "gif"
+    return "binary" if b"\x00" in data[:8192] else "text"
+
+
+def _has_fonts(resources, depth=0):
+    """True if a resource dictionary (or a form XObject it uses) declares fonts, i.e. can hold text"""
+    resources = resources.get_object() if resources is not None else None
+    if not resources:
+        return False
+    if "/Font" in resources:
+        return True
+    xobjects = resources.get("/XObject")
+    if xobjects is None or depth > 2:
+        return False
+    for xobject in xobjects.get_object().values():
+        xobject = xobject.get_object()
+        if xobject.get("/Subtype") == "/Form" and _has_fonts(xobject.get("/Resources"), depth + 1):
+            return True
+    return False
+
+
+def _triage_pdf(data, report):
+    """Page count from the page objects in the raw bytes (unknown when they sit in compressed object streams)"""
+    page_count = sum(1 for _ in PDF_PAGE_OBJECT.finditer(data))
+    if not page_count:
+        return
+    report["units"], report["unit"] = page_count, "pages"
+    report["estimated_chars"] = min(page_count, PDF_MAX_PAGES) * PDF_CHARS_PER_PAGE
+    if page_count > PDF_MAX_PAGES:
+        report["notes"].append(f"only the first {PDF_MAX_PAGES} of {page_count} pages will be read")
+
+
+def _check_pdf(data):
+    try:
+        reader = PyPDF2.PdfReader(io.BytesIO(data))
+        if reader.is_encrypted and not reader.decrypt(""):
+            raise UploadRejected("the PDF is password-protected")
+        page_count = len(reader.pages)
+        sample = [reader.pages[i] for i in range(min(page_count, PDF_SAMPLE_PAGES))]
+    except UploadRejected:
+        raise
+    except PyPDF2.errors.DependencyError:
+        raise UploadRejected("the PDF uses encryption that cannot be opened here")
+    except Exception as e:
+        raise UploadRejected(f"the PDF could not be read ({e})")
+    if page_count == 0:
+        raise UploadRejected("the PDF has no pages")
+    if not any(_has_fonts(page.get("/Resources")) for page in sample):
+        raise UploadRejected("the PDF has no text layer (scanned pages); upload the pages as images instead")
+
+
+def _open_zip(data):
+    """Open an OOXML package, rejecting archives that would expand past the budgets"""
+    try:
+        archive = zipfile.ZipFile(io.BytesIO(data))
+    except zipfile.BadZipFile as e:
+        raise UploadRejected(f"the file is a damaged archive ({e})")
+    entries = archive.infolist()
+    uncompressed = sum(entry.file_size for entry in entries)
+    if len(entries) > ZIP_MAX_ENTRIES:
+        raise UploadRejected(f"the archive has {len(entries):,} parts")
+    # The ratio check only applies past 10 MB, where a small archive can no longer be a normal document
+    if uncompressed > ZIP_MAX_UNCOMPRESSED or (
+            uncompressed > 10 * 1024 * 1024 and uncompressed > ZIP_MAX_RATIO * len(data)):
+        raise UploadRejected(f"the archive expands to {uncompressed / 1024 / 1024:,.0f} MB")
+    return archive, {entry.filename: entry.file_size for entry in entries}
+
+
+def _sheet_rows(archive, part):
+    """Row count from the <dimension ref="A1:E20001"/> near the start of a worksheet part"""
+    with archive.open(part) as f:
+        head = f.read(4096)
+    match = re.search(rb'<(?:\w+:)?dimension ref="[A-Z]+\d+:[A-Z]+(\d+)"', head)
+    return int(match.group(1)) if match else None
+
+
+def _triage_ooxml(data, report, extension):
+    archive, sizes = _open_zip(data)
+    with archive:
+        if OOXML_PARTS[extension] not in sizes:
+            raise UploadRejected(f"the archive is not a {extension} document")
+        if extension == ".docx":
+            # Page counts in docProps/app.xml are often stale, so only the body size is used
+            report["estimated_chars"] = sizes["word/document.xml"] // 8
+        elif extension == ".pptx":
+            slides = [name for name in sizes if re.fullmatch(r"ppt/slides/slide\d+\.xml", name)]
+            report["units"], report["unit"] = len(slides), "slides"
+            report["estimated_chars"] = sum(sizes[name] for name in slides) // 10
+        else:
+            _triage_xlsx(archive, sizes, report)
+
+
+def _triage_xlsx(archive, sizes, report):
+    if sizes.get("xl/sharedStrings.xml", 0) > XLSX_MAX_SHARED_STRINGS:
+        raise UploadRejected(f"the workbook's shared-string table is {sizes['xl/sharedStrings.xml'] / 1024 / 1024:,.0f} MB")
+    sheets = sorted(name for name in sizes if re.fullmatch(r"xl/worksheets/sheet\d+\.xml", name))
+    rows = [_sheet_rows(archive, name) for name in sheets]
+    report["units"], report["unit"] = len(sheets), "sheets"
+    report["rows"] = sum(count or 0 for count in rows)
+    report["estimated_chars"] = sum(sizes[name] for name in sheets) // 4 + sizes.get("xl/sharedStrings.xml", 0) // 2
+    largest = max((count or 0 for count in rows), default=0)
+    if largest > SHEET_MAX_ROWS:
+        report["notes"].append(f"only the first {SHEET_MAX_ROWS:,} rows of each sheet will be read "
+                               f"(largest has {largest:,})")
+
+
+def _triage_ole2(data, report, extension):
+    if data.find(ENCRYPTED_PACKAGE) != -1:
+        raise UploadRejected("the file is password-protected")
+    if extension != ".xls":
+        raise UploadRejected(f"the file is a legacy Office document, not {extension}; save it as {extension} first")
+    report["estimated_chars"] = len(data)
+
+
+def _check_xls(data):
+    try:
+        # on_demand parses only the workbook globals, not the sheets
+        book = xlrd.open_workbook(file_contents=data, on_demand=True)
+    except xlrd.XLRDError as e:
+        raise UploadRejected(f"the workbook could not be read ({e})")
+    book.release_resources()
+
+
+def _triage_text(data, report):
+    rows = data.count(b"\n") + (not data.endswith(b"\n"))
+    report["units"], report["unit"] = rows, "rows" if report["extension"] == ".csv" else "lines"
+    report["estimated_chars"] = len(data)
+    if report["extension"] == ".csv" and rows > SHEET_MAX_ROWS:
+        report["notes"].append(f"only the first {SHEET_MAX_ROWS:,} of {rows:,} rows will be read")
+
+
+def _triage_image(data, report):
+    if not HAS_PIL:
+        return
+    try:
+        # Image.open reads only the header
+        with Image.open(io.BytesIO(data)) as image:
+            width, height = image.size
+    except Exception:
+        raise UploadRejected("the image could not be read")
+    if width * height > IMAGE_MAX_PIXELS:
+        raise UploadRejected(f"the image is {width}x{height} pixels")
+    report["units"], report["unit"] = width * height, "pixels"
+
+
+# Container formats each extension may hold (.xls uploads are sometimes XLSX files renamed)
+EXPECTED_FORMATS = {
+    ".pdf": {"pdf"},
+    ".docx": {"zip", "ole2"},
+    ".pptx": {"zip", "ole2"},
+    ".xlsx": {"zip", "ole2"},
+    ".xls": {"ole2", "zip"},
+    ".csv": {"text"},
+    ".txt": {"text"},
+    # prepare_image and the vision request handle either encoding whatever the extension says
+    ".png": {"png", "jpeg"},
+    ".jpg": {"png", "jpeg"},
+    ".jpeg": {"png", "jpeg"},
+}
+
+
+def _check(data, report):
+    extension, detected = report["extension"], report["format"]
+    if extension not in EXPECTED_FORMATS:
+        raise UploadRejected(f"unsupported file type {extension}")
+    if not data:
+        raise UploadRejected("the file is empty")
+    if len(data) > UPLOAD_MAX_BYTES:
+        raise UploadRejected(f"the file is larger than {UPLOAD_MAX_BYTES / 1024 / 1024:,.0f} MB")
+    if detected not in EXPECTED_FORMATS[extension]:
+        raise UploadRejected(f"its content ({detected}) does not match the {extension} extension")
+    if detected == "pdf":
+        _triage_pdf(data, report)
+    elif detected == "ole2":
+        _triage_ole2(data, report, extension)
+    elif detected == "zip":
+        _triage_ooxml(data, report, ".xlsx" if extension == ".xls" else extension)
+    elif detected == "text":
+        _triage_text(data, report)
+    else:
+        _triage_image(data, report)
+    if report["estimated_chars"] and report["estimated_chars"] > MAX_EXTRACTED_CHARS:
+        report["notes"].append(f"about {MAX_EXTRACTED_CHARS:,} of an estimated "
+                               f"{report['estimated_chars']:,} characters will be kept")
+
+
+class TriageStats:
+    """Counters for triaged uploads (shared by every session in the process)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checked = 0
+        self.rejected = 0
+        self.capped = 0
+        self.seconds = 0.0
+        self.rejected_by_format = Counter()
+
+    def record(self, report):
+        with self._lock:
+            self.checked += 1
+            self.seconds += report["seconds"]
+            if report["rejected"]:
+                self.rejected += 1
+                self.rejected_by_format[report["format"]] += 1
+            elif report["notes"]:
+                self.capped += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "checked": self.checked,
+                "rejected": self.rejected,
+                "capped": self.capped,
+                "avg_ms": self.seconds * 1000 / self.checked if self.checked else 0.0,
+                "rejected_by_format": dict(self.rejected_by_format),
+            }
+
+
+_stats = TriageStats()
+
+
+def triage_stats():
+    return _stats.stats()
+
+
+def check_document(data, extension):
+    """Run the parser-based checks on an upload; raises UploadRejected. Called in the extraction worker."""
+    detected = sniff_format(data)
+    if detected == "pdf":
+        _check_pdf(data)
+    elif detected == "ole2" and extension == ".xls":
+        _check_xls(data)
+
+
+def triage_upload(name, data):
+    """Inspect an upload without extracting it.
+
+    Returns a report dict with the detected format, a unit count (pages,
+    slides, sheets, rows, lines or pixels) where the metadata has one, the
+    estimated extracted characters, notes about budget caps, and
+    "rejected": the reason the upload should not be extracted, or None.
+    """
+    report = {"name": name, "extension": Path(name).suffix.lower(), "format": sniff_format(data),
+              "bytes": len(data), "units": None, "unit": None, "estimated_chars": None,
+              "notes": [], "rejected": None}
+    start = time.perf_counter()
+    try:
+        _check(data, report)
+    except UploadRejected as e:
+        report["rejected"] = str(e)
+    except Exception as e:
+        # Triage is best effort; the worker's own time and memory limits still apply
+        logger.warning("Triage of %s failed, extracting anyway: %s", name, e)
+    report["seconds"] = time.perf_counter() - start
+    _stats.record(report)
+    return report